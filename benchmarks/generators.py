@@ -0,0 +1,85 @@
+"""Synthetic trees of a given size for the benchmarks.
+
+All element nodes have values from a small alphabet of XML-compatible names,
+so the same patterns can be searched in all shapes and every tree can be
+saved in every format. The generators are deterministic and they do not
+recurse, so they can create trees of any depth.
+"""
+
+import random
+from treepace.nodes import Node
+from treepace.trees import Tree
+
+ALPHABET = 'abcde'
+
+def deep(size):
+    """A single path of nodes, each one being the only child of the previous
+    one."""
+    root = node = Node('root')
+    for number in range(size - 1):
+        child = Node(ALPHABET[number % len(ALPHABET)])
+        node.add_child(child)
+        node = child
+    return Tree(root)
+
+
+def wide(size):
+    """A root with (size - 1) / 2 children, each one having one leaf child."""
+    root = Node('root')
+    for number in range((size - 1) // 2):
+        child = Node(ALPHABET[number % len(ALPHABET)])
+        child.add_child(Node(ALPHABET[(number + 1) % len(ALPHABET)]))
+        root.add_child(child)
+    if size % 2 == 0:
+        root.add_child(Node(ALPHABET[0]))
+    return Tree(root)
+
+
+def random_tree(size, seed=0):
+    """A random recursive tree: the parent of each node is chosen uniformly
+    from the previous nodes, so the expected depth is logarithmic."""
+    generator = random.Random(seed)
+    nodes = [Node('root')]
+    for _ in range(size - 1):
+        node = Node(generator.choice(ALPHABET))
+        generator.choice(nodes).add_child(node)
+        nodes.append(node)
+    return Tree(nodes[0])
+
+
+def xml_like(size, seed=0):
+    """A document-like tree: elements have 1 to 6 children and some leaves
+    are attribute or text nodes (the values used by XmlText)."""
+    generator = random.Random(seed)
+    root = Node('root')
+    queue, head, count = [root], 0, 1
+    while count < size:
+        parent = queue[head] if head < len(queue) else root
+        head += 1
+        for _ in range(min(generator.randint(1, 6), size - count)):
+            kind = generator.random()
+            if kind < 0.15:
+                child = Node({'id': str(count)})
+            elif kind < 0.35:
+                child = Node({'xmltext': 'text %d' % count})
+            else:
+                child = Node(generator.choice(ALPHABET))
+                queue.append(child)
+            parent.add_child(child)
+            count += 1
+    return Tree(root)
+
+
+def units(unit, size):
+    """A root with copies of the unit tree (given as a parenthesized text)
+    as its children, having about the given total number of nodes."""
+    template = Tree.load(unit)
+    unit_size = sum(1 for _ in template.preorder())
+    root = Node('root')
+    for _ in range(max(1, (size - 1) // unit_size)):
+        root.add_child(template.copy().root)
+    return Tree(root)
+
+
+SHAPES = {'deep': deep, 'wide': wide, 'random': random_tree,
+          'xml': xml_like}
@@ -0,0 +1,50 @@
+"""Measure the time of importing treepace in a fresh interpreter.
+
+Each measurement starts a new Python process; the time of starting an empty
+interpreter is subtracted. The deferred cost -- importing the parser during
+the first search -- is measured separately.
+
+Usage: python benchmarks/import_time.py [repetitions]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    ('empty interpreter', 'pass'),
+    ('import treepace', 'import treepace'),
+    ('import + first search', "import treepace\n"
+     "treepace.Tree(treepace.Node('a')).search('a < b')"),
+]
+
+def measure(statement, repetitions):
+    """Return the median wall time of running the statement in a new
+    process."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], env=env, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    baseline = None
+    for name, statement in STATEMENTS:
+        seconds = measure(statement, repetitions)
+        if baseline is None:
+            baseline = seconds
+            print("%-24s %7.1f ms" % (name, 1000 * seconds))
+        else:
+            print("%-24s %7.1f ms (+%.1f ms)" % (name, 1000 * seconds,
+                                                 1000 * (seconds - baseline)))
+
+
+if __name__ == '__main__':
+    main()
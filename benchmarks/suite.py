@@ -0,0 +1,207 @@
+"""Measure the time and peak memory of the tree operations on synthetic trees
+of growing sizes and check that they scale linearly.
+
+Each benchmark is run on every tree shape from the generators module (or on
+a tree of repeated units for the replacement strategies) and every size.
+The time is the minimum of several runs; the peak memory is measured by
+tracemalloc in a separate run, because tracing slows the operations down.
+Trees modified by the benchmark are generated again before each run and
+the generation is not measured.
+
+For each benchmark and shape, the slope of the log-log line fitted to
+the times is reported; a slope above the limit (1.5 by default) indicates
+super-linear behavior and it is flagged in the results.
+
+Usage: python benchmarks/suite.py [--quick] [--sizes N ...] [-o results.json]
+"""
+
+import argparse
+import gc
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import treepace
+from treepace.formats import DotText, IndentedText, ParenText, XmlText
+from treepace.trees import Tree
+import generators
+
+SIZES = [1000, 10000, 100000, 1000000]
+QUICK_SIZES = [1000, 4000, 16000]
+
+PATTERN = 'a < b'
+# the matches of single-node patterns never overlap
+PROGRAM = 'a -> x\nb -> y < z'
+
+# the trees built from these units are replaced using the given strategy
+STRATEGIES = {
+    'SameShape': ('a (b)', 'a < b', 'x < y'),
+    'ToOneNode': ('a (b (c))', 'a < b', 'x'),
+    'NoConnectedLeaves': ('a (b)', 'a < b', 'x < y, z'),
+    'SameLeafCount': ('a (b (c))', 'a < b', 'x < y < z'),
+    'SameConnectedCount': ('a (b (c) d)', 'a < b, d', 'x < y < z'),
+}
+
+class Benchmark:
+    """An operation measured on trees of one shape.
+
+    The setup function creates the arguments of the operation from a tree;
+    it is called before each run if the operation modifies them.
+    """
+
+    def __init__(self, name, shape, make_tree, operation,
+                 setup=lambda tree: (tree,), modifies=False):
+        """Save the benchmark definition."""
+        self.name = name
+        self.shape = shape
+        self._make_tree = make_tree
+        self._operation = operation
+        self._setup = setup
+        self._modifies = modifies
+
+    def run(self, size, min_time, max_runs):
+        """Return the minimum time of the runs and the peak memory allocated
+        by one run."""
+        arguments = self._setup(self._make_tree(size))
+        times = []
+        while len(times) < max_runs and (not times or sum(times) < min_time):
+            if self._modifies and times:
+                arguments = self._setup(self._make_tree(size))
+            gc.collect()
+            start = time.perf_counter()
+            self._operation(*arguments)
+            times.append(time.perf_counter() - start)
+
+        if self._modifies:
+            arguments = self._setup(self._make_tree(size))
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            self._operation(*arguments)
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+        return min(times), peak
+
+
+def benchmarks():
+    """Return a list of all benchmarks."""
+    result = []
+    for shape, make_tree in generators.SHAPES.items():
+        add = lambda name, *args, **kwargs: result.append(
+            Benchmark(name, shape, make_tree, *args, **kwargs))
+        add('search', lambda tree: tree.search(PATTERN))
+        add('match', lambda tree: tree.match('root < .'))
+        add('fullmatch', lambda tree: tree.fullmatch('root < .'))
+        add('replace', lambda tree: tree.replace('a', 'x'), modifies=True)
+        add('transform', lambda tree: tree.transform(PROGRAM), modifies=True)
+        # the indented outputs of a path have a size quadratic in its length
+        formats = [ParenText] if shape == 'deep' else [IndentedText,
+                                                       ParenText, XmlText]
+        for fmt in formats:
+            add('load ' + fmt.__name__, Tree.load,
+                setup=lambda tree, fmt=fmt: (tree.save(fmt), fmt))
+        for fmt in formats + [DotText]:
+            add('save ' + fmt.__name__, lambda tree, fmt=fmt: tree.save(fmt))
+            add('save_to ' + fmt.__name__,
+                lambda tree, fmt=fmt: tree.save_to(io.StringIO(), fmt))
+
+    for strategy, (unit, pattern, replacement) in STRATEGIES.items():
+        result.append(Benchmark('replace ' + strategy, 'units',
+            lambda size, unit=unit: generators.units(unit, size),
+            lambda tree, pattern=pattern, replacement=replacement:
+                tree.replace(pattern, replacement),
+            modifies=True))
+    return result
+
+
+def slope(sizes, times):
+    """Return the slope of the least-squares line fitted to the logarithms
+    of the sizes and times, or None if there are less than two points."""
+    points = [(math.log(size), math.log(seconds))
+              for size, seconds in zip(sizes, times) if seconds > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def main(argv=None):
+    """Run the selected benchmarks, output the results and return the exit
+    status."""
+    parser = argparse.ArgumentParser(description="Run the benchmark suite "
+                                     "and print the results as JSON.")
+    sizes = parser.add_mutually_exclusive_group()
+    sizes.add_argument('--sizes', type=int, nargs='+', metavar='N',
+        help="the tree sizes (default: %s)" % ' '.join(map(str, SIZES)))
+    sizes.add_argument('--quick', action='store_true',
+        help="use small sizes (%s)" % ' '.join(map(str, QUICK_SIZES)))
+    parser.add_argument('-b', '--benchmark', action='append', default=[],
+        metavar='NAME', help="run only the benchmarks whose 'name/shape' "
+                             "contains this text (can be repeated)")
+    parser.add_argument('--min-time', type=float, default=0.2,
+        help="repeat each measurement until it takes this many seconds")
+    parser.add_argument('--max-runs', type=int, default=20,
+        help="the maximum number of runs of each measurement")
+    parser.add_argument('--max-slope', type=float, default=1.5,
+        help="flag the benchmarks whose time grows faster than "
+             "size^MAX_SLOPE")
+    parser.add_argument('-o', '--output',
+        help="write the JSON results to this file instead of the output")
+    parser.add_argument('--check', action='store_true',
+        help="exit with status 1 if any benchmark is flagged")
+    args = parser.parse_args(argv)
+    sizes = sorted(args.sizes or (QUICK_SIZES if args.quick else SIZES))
+
+    results, scaling = [], []
+    for benchmark in benchmarks():
+        label = '%s/%s' % (benchmark.name, benchmark.shape)
+        if args.benchmark and not any(text in label
+                                      for text in args.benchmark):
+            continue
+        times = []
+        for size in sizes:
+            seconds, peak = benchmark.run(size, args.min_time, args.max_runs)
+            times.append(seconds)
+            results.append({'benchmark': benchmark.name,
+                            'shape': benchmark.shape, 'size': size,
+                            'seconds': seconds, 'peak_bytes': peak})
+            print("%-36s %8d %10.4f s %10.1f MB" % (label, size, seconds,
+                  peak / 1e6), file=sys.stderr)
+        exponent = slope(sizes, times)
+        flagged = exponent is not None and exponent > args.max_slope
+        scaling.append({'benchmark': benchmark.name, 'shape': benchmark.shape,
+                        'slope': exponent, 'superlinear': flagged})
+        if flagged:
+            print("%s: super-linear scaling (slope %.2f)" % (label, exponent),
+                  file=sys.stderr)
+
+    report = {'treepace': treepace.__version__,
+              'python': platform.python_version(),
+              'platform': platform.platform(), 'sizes': sizes,
+              'max_slope': args.max_slope, 'results': results,
+              'scaling': scaling}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if args.check and any(item['superlinear']
+                                   for item in scaling) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,25 @@
 #!/usr/bin/env python
 
-"""Package setup script; requires setuptools (or Python >=3.4 which
-bundles it)."""
+"""Package setup script; requires setuptools."""
 
+import re
 from setuptools import setup
 
+with open('treepace/__init__.py', encoding='utf-8') as init:
+    version = re.search(r"__version__ = '(.*)'", init.read()).group(1)
+
 setup(name='Treepace',
-      version='0.3',
+      version=version,
       description='Tree Transformation Language',
       author='Matúš Sulír',
       url='https://github.com/sulir/treepace',
       packages=['treepace', 'treepace.examples'],
+      python_requires='>=3.8',
       test_suite='tests',
-      install_requires=['parsimonious>=0.5'],
+      entry_points={
+          'console_scripts': ['treepace = treepace.cli:main']
+      },
+      tests_require=['parsimonious>=0.9'],
       extras_require={
           'ipython': ['ipython>=2.0.0']
       },
@@ -22,9 +29,11 @@ setup(name='Treepace',
           'License :: OSI Approved :: MIT License',
           'Operating System :: OS Independent',
           'Programming Language :: Python :: 3',
-          'Programming Language :: Python :: 3.2',
-          'Programming Language :: Python :: 3.3',
-          'Programming Language :: Python :: 3.4',
+          'Programming Language :: Python :: 3.8',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
+          'Programming Language :: Python :: 3.12',
           'Topic :: Software Development :: Libraries',
       ]
      )
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from treepace.cli import main
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = lambda *names: os.path.join(self.directory.name, *names)
+        os.makedirs(self.path('in', 'sub'))
+        files = {('rules',): 'b -> x\nx < c -> x < d\n',
+                 ('in', 'a.paren'): 'r (b (c) b)',
+                 ('in', 'sub', 'b.xml'): '<r><b><c/></b></r>',
+                 ('in', 'c.txt'): 'r\n    b\n',
+                 ('in', 'ignored.dat'): 'b'}
+        for names, text in files.items():
+            with open(self.path(*names), 'w') as file:
+                file.write(text)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def run_main(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            status = main([self.path('rules')] + list(args))
+        return status, stdout.getvalue(), stderr.getvalue()
+    
+    def read(self, *names):
+        with open(self.path(*names)) as file:
+            return file.read()
+    
+    def test_stdout(self):
+        status, out, err = self.run_main(self.path('in', 'a.paren'))
+        self.assertEqual(status, 0)
+        self.assertEqual(out, 'r (x (d) x)\n')
+        self.assertIn('1 files transformed, 0 failed, 4 nodes', err)
+    
+    def test_output_dir(self):
+        for jobs in ['1', '2']:
+            output = self.path('out' + jobs)
+            status, out, err = self.run_main(self.path('in'), '-j', jobs,
+                                             '-o', output, '-t', 'paren')
+            self.assertEqual(status, 0)
+            self.assertEqual(out, '')
+            self.assertEqual(self.read('out' + jobs, 'a.paren'),
+                             'r (x (d) x)\n')
+            self.assertEqual(self.read('out' + jobs, 'sub', 'b.paren'),
+                             'r (x (d))\n')
+            self.assertEqual(self.read('out' + jobs, 'c.paren'), 'r (x)\n')
+            self.assertFalse(os.path.exists(self.path(output, 'ignored.dat')))
+            self.assertIn('latency', err)
+    
+    def test_in_place_and_errors(self):
+        with open(self.path('in', 'bad.xml'), 'w') as file:
+            file.write('<r>')
+        status, _, err = self.run_main(self.path('in'), '-i', '-q')
+        self.assertEqual(status, 1)
+        self.assertIn('bad.xml: ParseError', err)
+        self.assertEqual(self.read('in', 'sub', 'b.xml'),
+                         '<r>\n    <x>\n        <d/>\n    </x>\n</r>\n')
+    
+    def test_in_place_failure(self):
+        def save_to(tree, file, fmt):
+            file.write('r (')
+            raise OSError("disk full")
+        with mock.patch('treepace.trees.Tree.save_to', save_to):
+            status, _, err = self.run_main(self.path('in', 'a.paren'), '-i')
+        self.assertEqual(status, 1)
+        self.assertIn('a.paren: OSError: disk full', err)
+        self.assertEqual(self.read('in', 'a.paren'), 'r (b (c) b)')
+        self.assertEqual(sorted(os.listdir(self.path('in'))),
+                         ['a.paren', 'c.txt', 'ignored.dat', 'sub'])
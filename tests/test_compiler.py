@@ -1,4 +1,8 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+from treepace.cache import DiskCache
 from treepace.compiler import Compiler
 from treepace.instructions import (AddNode, AddReference, Find, GoToParent,
     GroupEnd, GroupStart, SearchReference, SetRelation)
@@ -18,3 +22,45 @@ class TestCompiler(unittest.TestCase):
                     SetRelation(NextSibling), AddNode('a[0]'),
                     SetRelation(NextSibling), AddReference(0), GoToParent()]
         self.assertEqual(result, expected)
+    
+    def test_specialize_find(self):
+        kinds = [(instr.kind, instr.operand) for instr in
+                 Compiler.compile_pattern('. < x, [_ == 1] & [_ in "ab"]')
+                 if isinstance(instr, Find)]
+        expected = [('any', None), ('text', 'x'), ('equal', 1),
+                    ('member', 'ab')]
+        self.assertEqual(kinds, expected)
+        self.assertEqual(Find('_.isdigit()').kind, None)
+        self.assertEqual(Find('_ == ref', ref=[1]).operand, [1])
+    
+    def test_disk_cache(self):
+        rule = '{cached} < [_ == $1 or x] -> [$1 + "!"] < $1'
+        with tempfile.TemporaryDirectory() as directory:
+            Compiler.set_cache(DiskCache(directory))
+            try:
+                expected = Compiler.compile_rule(rule)
+                Compiler.compile_rule.cache_clear()
+                with mock.patch('treepace.parser.parse_rule', None):
+                    result = Compiler.compile_rule(rule)
+            finally:
+                Compiler.set_cache(None)
+                Compiler.compile_rule.cache_clear()
+        self.assertIsNot(result, expected)
+        self.assertEqual(result, expected)
+    
+    def test_unwritable_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(os.path.join(directory, 'cache'))
+            os.rmdir(cache.directory)
+            cache.put('pattern', 'a', [Find('True')])
+            self.assertIsNone(cache.get('pattern', 'a'))
+    
+    def test_cache_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory)
+            cache.put('pattern', 'a', [Find('True')])
+            self.assertEqual(cache.get('pattern', 'a'), [Find('True')])
+            with mock.patch('treepace.__version__', 'other'):
+                self.assertIsNone(cache.get('pattern', 'a'))
+            with mock.patch('treepace.cache.FORMAT', 0):
+                self.assertIsNone(cache.get('pattern', 'a'))
@@ -1,8 +1,11 @@
+import io
+import mmap
 import re
+import tempfile
 from textwrap import dedent
 import unittest
-from treepace.formats import (IndentedText, ParenText, XmlText,
-    InvalidFormatError)
+from treepace.formats import (DotText, IndentedText, ParenText, XmlText,
+    InvalidFormatError, _paren_tokens, _read_lines)
 from treepace.nodes import Node
 from treepace.trees import Tree
 
@@ -53,3 +56,44 @@ class TestFormats(unittest.TestCase):
     
     def test_save_xml(self):
         self.assertEqual(re.sub(r'\s+', '', self.TREE.save(XmlText)), self.XML)
+    
+    def test_deep_tree(self):
+        depth = 3000
+        par = ' ('.join('n%d' % i for i in range(depth)) + ')' * (depth - 1)
+        tree = Tree.load(par, ParenText)
+        self.assertEqual(tree.leaves[0].value, 'n%d' % (depth - 1))
+        self.assertEqual(tree.save(ParenText), par)
+        self.assertEqual(tree.copy(), tree)
+        for fmt in IndentedText, XmlText:
+            self.assertEqual(Tree.load(tree.save(fmt), fmt), tree)
+    
+    def test_load_file(self):
+        for fmt, text in [(IndentedText, self.INDENTED),
+                          (ParenText, self.PARENTHESIZED),
+                          (XmlText, self.XML)]:
+            self.assertEqual(Tree.load(io.StringIO(text), fmt), self.TREE)
+            self.assertEqual(Tree.load(io.BytesIO(text.encode()), fmt),
+                             self.TREE)
+        
+        with tempfile.TemporaryFile() as file:
+            file.write(self.PARENTHESIZED.encode())
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self.assertEqual(Tree.load(data, ParenText), self.TREE)
+        for fmt in IndentedText, ParenText:
+            self.assertRaises(InvalidFormatError, lambda: Tree.load(' ', fmt))
+    
+    def test_load_chunks(self):
+        chunks = ['roo', 't (it', 'em1 (', 'sub (s', 'ubsub)) item2 item3)']
+        tokens = list(_paren_tokens(chunks))
+        self.assertEqual(tokens, re.findall(r'\(|\)|[^\(\)\s]+', ''.join(chunks)))
+        self.assertEqual(list(_read_lines(io.StringIO('a\r\n  b\n  c'))),
+                         ['a', '  b', '  c'])
+    
+    def test_save_to(self):
+        for fmt in IndentedText, ParenText, XmlText, DotText:
+            file = io.StringIO()
+            self.TREE.save_to(file, fmt)
+            self.assertEqual(file.getvalue(), self.TREE.save(fmt))
+        self.assertEqual(list(ParenText().chunks(self.TREE.root))[:3],
+                         ['root', ' (', 'item1'])
@@ -0,0 +1,38 @@
+import unittest
+from treepace.formats import IndentedText
+from treepace.frozen import FrozenTree
+from treepace.nodes import Node
+from treepace.trees import Tree
+
+class TestFrozenTree(unittest.TestCase):
+    TREE = 'a (b (c d) b (c) e)'
+    
+    def test_conversion(self):
+        tree = Tree.load(self.TREE)
+        frozen = FrozenTree.from_tree(tree)
+        self.assertEqual(len(frozen), 7)
+        self.assertEqual(frozen, tree)
+        self.assertEqual(frozen.to_tree(), tree)
+        self.assertEqual(str(frozen), self.TREE)
+        self.assertEqual(frozen.save(IndentedText), tree.save(IndentedText))
+        self.assertEqual(FrozenTree.load(self.TREE), tree)
+    
+    def test_nodes(self):
+        frozen = FrozenTree.load(self.TREE)
+        d = frozen.node('d')
+        self.assertEqual(d.parent, frozen.node('b'))
+        self.assertEqual((d.index, d.level, d.str_path()), (1, 2, 'a/b/d'))
+        self.assertEqual(frozen.root.children[-1].value, 'e')
+        self.assertEqual(frozen.leaves, list(frozen.preorder())[2:4] +
+                         list(frozen.preorder())[5:])
+        self.assertFalse(hasattr(d, '__dict__'))
+    
+    def test_search(self):
+        tree = Tree.load(self.TREE)
+        frozen = FrozenTree.from_tree(tree)
+        for pattern in ['b < c', '{.} < ., $1', 'a < b & e']:
+            self.assertEqual(list(map(str, frozen.search(pattern))),
+                             list(map(str, tree.search(pattern))))
+        self.assertTrue(frozen.fullmatch('a < b < c, d > , b < c > , e'))
+        self.assertEqual(frozen.first('b < c').group().to_tree(),
+                         Tree(Node('b', [Node('c')])))
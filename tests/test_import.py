@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+import unittest
+
+class TestImport(unittest.TestCase):
+    def test_lazy_modules(self):
+        code = ("import sys, treepace\n"
+                "deferred = ['parsimonious', 'treepace.parser', 'json',\n"
+                "            'xml.etree.ElementTree', 'urllib.parse', 'ast']\n"
+                "print(sorted(set(deferred) & set(sys.modules)))\n"
+                "treepace.Tree.load('a (b)').search('a < b')\n"
+                "print('treepace.parser' in sys.modules)\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=env, universal_newlines=True)
+        self.assertEqual(output.splitlines(), ['[]', 'True'])
@@ -0,0 +1,82 @@
+import unittest
+from treepace.index import StructureIndex, ValueIndex
+from treepace.nodes import Node
+from treepace.replace import ReplaceError
+from treepace.search import Match
+from treepace.trees import Tree
+
+class TestValueIndex(unittest.TestCase):
+    def test_maintenance(self):
+        tree = Tree.load('a (b (c) b (d))')
+        index = tree.add_index(ValueIndex())
+        self.assertEqual(index.count('b'), 2)
+        
+        first_b, second_b = index.find('b')
+        self.assertEqual(index.find('b', second_b), [second_b])
+        first_b.value = 'x'
+        self.assertEqual(index.find('b'), [second_b])
+        self.assertEqual(index.find('x'), [first_b])
+        
+        second_b.detach()
+        self.assertEqual(index.count('b') + index.count('d'), 0)
+        tree.root.add_child(Node('e', [Node('b')]))
+        self.assertEqual(index.find('b')[0].parent.value, 'e')
+        self.assertEqual(len(index), 5)
+        
+        tree.remove_index(index)
+        tree.root.add_child(Node('b'))
+        self.assertEqual(index.count('b'), 1)
+    
+    def test_move_between_trees(self):
+        first, second = Tree.load('r (q (v))'), Tree.load('s (t)')
+        first_values = first.add_index(ValueIndex())
+        first_structure = first.add_index(StructureIndex())
+        second_values = second.add_index(ValueIndex())
+        second.root.add_child(first.node('q'))
+        self.assertEqual(first.search('v'), [])
+        self.assertEqual((len(first_values), len(first_structure)), (1, 1))
+        self.assertTrue(first.fullmatch('r'))
+        self.assertEqual(second_values.count('v'), 1)
+        self.assertEqual(len(second.search('s < t, q < v')), 1)
+        
+        Tree(Node('u')).root.add_child(second.node('q'))
+        self.assertEqual(len(second_values), 2)
+    
+    def test_search(self):
+        tree = Tree.load('a (b (c) x (b (c)) b)')
+        expected = [str(match) for match in tree.search('b < c')]
+        tree.add_index(ValueIndex())
+        self.assertEqual([str(match) for match in tree.search('b < c')],
+                         expected)
+        subtree = Tree(tree.node('x'))
+        self.assertEqual(len(subtree.search('b')), 1)
+
+
+class TestStructureIndex(unittest.TestCase):
+    def test_maintenance(self):
+        tree = Tree.load('a (b (c) d)')
+        index = tree.add_index(StructureIndex())
+        b, c, d = tree.node('b'), tree.node('c'), tree.node('d')
+        self.assertTrue(tree.is_ancestor(b, c))
+        self.assertFalse(tree.is_ancestor(c, b) or tree.is_ancestor(d, c))
+        
+        for number in range(100):
+            b.insert_child(Node(number), 1)
+            c.insert_child(Node('x'), 0)
+        d.add_child(c)
+        self.assertTrue(index.is_ancestor(d, c))
+        self.assertFalse(index.is_ancestor(b, c))
+        nodes = list(tree.preorder())
+        self.assertEqual(tree.document_order(reversed(nodes)), nodes)
+        self.assertEqual(len(index), len(nodes))
+        c.detach()
+        self.assertEqual(len(index), len(nodes) - 101)
+    
+    def test_matches(self):
+        tree = Tree.load('a (b (c) b (c d))')
+        tree.add_index(StructureIndex())
+        Match.check_disjoint(tree.search('b < c'))
+        self.assertRaises(ReplaceError, Match.check_disjoint,
+                          tree.search('b < .'))
+        self.assertTrue(tree.fullmatch('a < b < c > , b < c, d'))
+        self.assertFalse(tree.fullmatch('a < b < c'))
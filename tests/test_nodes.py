@@ -0,0 +1,30 @@
+import unittest
+from treepace.nodes import Node
+
+class TestNode(unittest.TestCase):
+    def test_siblings(self):
+        a, b, c = Node('a'), Node('b'), Node('c')
+        root = Node('root', [a, c])
+        root.insert_child(b, 1)
+        self.assertEqual(root.children, (a, b, c))
+        self.assertEqual([a.index, b.index, c.index], [0, 1, 2])
+        self.assertEqual((b.previous_sibling, b.next_sibling), (a, c))
+        self.assertIsNone(c.next_sibling)
+        self.assertIs(root.children, root.children)
+        
+        a.detach()
+        self.assertEqual((b.index, c.index), (0, 1))
+        self.assertIsNone(b.previous_sibling)
+        self.assertIsNone(a.parent)
+        c.detach()
+        root.insert_child(a, 0)
+        self.assertEqual(root.children, (a, b))
+        self.assertEqual((a.next_sibling, b.index), (b, 1))
+    
+    def test_move(self):
+        child = Node('x')
+        first, second = Node('1', [child]), Node('2')
+        second.add_child(child)
+        self.assertTrue(first.is_leaf)
+        self.assertEqual(second.children, (child,))
+        self.assertEqual(child.str_path(), '2/x')
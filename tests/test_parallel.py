@@ -0,0 +1,21 @@
+import unittest
+from treepace.parallel import SharedTree
+from treepace.trees import Tree
+
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        self.tree = Tree.load('r (a (b c (b)) d (a (c b)) a (b (a (b))))')
+    
+    def test_parallel_search(self):
+        for pattern in ['a < b', '.', '{a} < {b}', 'a < c, b', '{.} < $1',
+                        '[_ == "a"] < [node.is_leaf]']:
+            expected = self.tree.search(pattern)
+            found = self.tree.parallel_search(pattern, processes=2)
+            self.assertEqual(list(map(str, found)), list(map(str, expected)))
+            self.assertEqual([m.group().root for m in found],
+                             [m.group().root for m in expected])
+    
+    def test_shared_tree(self):
+        with SharedTree(self.tree, 2) as shared:
+            self.assertEqual(len(shared.search('b')), 5)
+            self.assertEqual(len(shared.search('[_ == x]', x='c')), 2)
@@ -0,0 +1,61 @@
+import itertools
+import unittest
+from treepace.compiler import CompileError
+from treepace.parser import (ParseError, parse_pattern, parse_replacement,
+    parse_rule)
+
+grammar, skip_reason = None, None
+try:
+    from parsimonious.exceptions import ParseError as GrammarParseError
+except ImportError:
+    skip_reason = "the reference grammar requires parsimonious"
+else:
+    try:
+        from tests import grammar
+    except Exception as e:
+        skip_reason = ("the reference grammar cannot be built by this "
+                       "parsimonious version (%s: %s)" % (type(e).__name__, e))
+
+class TestParser(unittest.TestCase):
+    PATTERNS = ['a', ' . ', '"x y"', '{a} < $1', '[x[0] == [1][0]]',
+                'a < b > , c & {d < {.}} > ', '{a}, {b} < $2 , $1',
+                'a > >', '$1', 'a <', 'a b', '[x', '[]', '""', '{a',
+                'a -> b', '$ 1', 'a\n', '[a\nb]', '{a} < [)]',
+                'a << b ^ c', '. < a ~ b ; c', 'a < < b', 'a <<']
+    REPLACEMENTS = ['a', '[_ + 1]', '$0 < b, [x] >', 'a < .', '. < a',
+                    'a > >', 'a & b', '{a}', 'a <']
+    
+    @unittest.skipIf(grammar is None, skip_reason)
+    def test_conformance(self):
+        pairs = [(parse_pattern, grammar.parse_pattern, self.PATTERNS),
+                 (parse_replacement, grammar.parse_replacement,
+                  self.REPLACEMENTS),
+                 (parse_rule, grammar.parse_rule,
+                  [p + '->' + r for p, r in itertools.product(
+                      self.PATTERNS[:8], self.REPLACEMENTS)])]
+        for parse, reference, texts in pairs:
+            for text in texts:
+                self.assertEqual(self.outcome(parse, text),
+                                 self.outcome(reference, text), text)
+    
+    def outcome(self, parse, text):
+        try:
+            result = parse(text)
+        except (ParseError, GrammarParseError):
+            return 'syntax error'
+        except Exception:
+            return 'other error'
+        return result
+    
+    def test_errors(self):
+        with self.assertRaises(ParseError) as context:
+            parse_pattern('a < {b , }')
+        self.assertEqual(context.exception.position, 9)
+        self.assertIn("Expected a node, found '}'", str(context.exception))
+        with self.assertRaises(ParseError) as context:
+            parse_rule('a - b')
+        self.assertEqual(context.exception.position, 2)
+        self.assertRaisesRegex(CompileError, 'Too many parent', parse_pattern,
+                               'a > >')
+        # syntax errors are reported first
+        self.assertRaises(ParseError, parse_pattern, '$1 <')
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+from treepace.compiler import Compiler
+from treepace.frozen import FrozenTree
+from treepace.index import ValueIndex
+from treepace.relations import Descendant
+from treepace.search import SearchMachine
+from treepace.stats import SearchStats
+from treepace.trees import Tree
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tree = Tree.load('r (a (b (p)) x (y (p) z) a (b (c p)) p)')
+    
+    def test_same_results(self):
+        patterns = ['. < . < p', '. < b < c, p', '. < {.} & z', '. < b, x',
+                    '. < a < b > , x',
+                    '[_ != "r"] < [_ in "by"] < p', '{.} < p, $1', '. < c']
+        trees = [self.tree, Tree(self.tree.node('x')),
+                 FrozenTree.from_tree(self.tree)]
+        for tree in trees:
+            for pattern in patterns:
+                instructions = Compiler.compile_pattern(pattern)
+                expected = SearchMachine(tree.root, instructions, {}).search()
+                found = tree.search(pattern)
+                self.assertEqual(list(map(str, found)),
+                                 list(map(str, expected)))
+                self.assertEqual([m.group().root for m in found],
+                                 [m.group().root for m in expected])
+    
+    def test_explain(self):
+        plan = self.tree.explain('. < . < p')
+        self.assertEqual(plan.anchor, 2)
+        self.assertEqual(plan.estimates, {2: 4})
+        self.assertEqual([str(node) for node in plan.roots], ['a', 'x', 'a'])
+        self.assertIn('reach the root by parent, parent', str(plan))
+        self.assertIsNone(self.tree.explain('a < b < c').anchor)
+        
+        self.tree.add_index(ValueIndex())
+        self.assertEqual(self.tree.explain('a < b < c').anchor, 2)
+        self.assertEqual(len(self.tree.search('a < b < c')), 1)
+        self.assertIsNone(self.tree.explain('. < p', str=repr).anchor)
+    
+    def test_cost(self):
+        tree = Tree.load('r (a (p p p) b (p))')
+        self.assertIsNone(tree.explain('. < . < p').anchor)
+        expected = list(map(str, tree.finditer('. < . < p')))
+        # the scan reuses the nodes listed by the counting pass
+        with mock.patch.object(Descendant, 'search', side_effect=
+                               AssertionError("the tree is traversed again")):
+            self.assertEqual(list(map(str, tree.search('. < . < p'))),
+                             expected)
+        
+        with SearchStats() as stats:
+            plan = self.tree.explain('. < . < p')
+            matches = self.tree.search('. < . < p')
+        self.assertEqual(len(matches), 3)
+        self.assertEqual(stats.searches, 1)
+        self.assertEqual(stats.planned_nodes, 2 * plan.visited)
+        self.assertEqual(plan.visited, 13 + 4 + 3)
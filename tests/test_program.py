@@ -0,0 +1,46 @@
+import unittest
+from treepace.compiler import Compiler
+from treepace.program import CombinedMatcher, Program, pattern_reach
+from treepace.search import SearchMachine
+from treepace.trees import Tree
+
+class TestProgram(unittest.TestCase):
+    def test_reach(self):
+        reach = lambda pattern: pattern_reach(Compiler.compile_pattern(pattern))
+        self.assertEqual(reach('a'), (0, 0))
+        self.assertEqual(reach('a < b < c > , d'), (0, 2))
+        self.assertEqual(reach('a < b > , c'), (-1, 1))
+        self.assertEqual(reach('a, b'), (-1, 0))
+        self.assertIsNone(reach('{a} < $1'))
+        self.assertIsNone(reach('[node.is_leaf]'))
+        self.assertEqual(reach('{a} < [_ == $1]'), (0, 1))
+        self.assertEqual(reach('. < a ~ b ; c'), (0, 1))
+        self.assertIsNone(reach('a << b'))
+        self.assertIsNone(reach('a ^ b'))
+    
+    def test_incremental_transform(self):
+        tree = Tree.load('r (a (a (a (b k) k) k) c (d))')
+        tree.transform('''
+            a < b -> b < b
+            r < b, c -> r < b, d
+            [node.is_leaf and _ == 'd'] -> e''')
+        self.assertEqual(tree, Tree.load('r (b (b (b (b k) k) k) d (e))'))
+    
+    def test_combined_matcher(self):
+        patterns = ['a < b', 'a < c', 'a', '[_ != "a"]', '. < c']
+        matcher = CombinedMatcher([Compiler.compile_pattern(pattern)
+                                   for pattern in patterns])
+        tree = Tree.load('a (b c (c))')
+        vm = SearchMachine(tree.root, [], {})
+        self.assertEqual(matcher.match(tree.root, vm), {0, 1, 2, 4})
+        self.assertEqual(matcher.match(tree.root.children[1], vm), {3, 4})
+    
+    def test_program_reuse(self):
+        program = Program('''
+            a < b -> c
+            c -> d < e''')
+        trees = [Tree.load('r (a (b) c)'), Tree.load('a (b)')]
+        for tree in trees:
+            tree.transform(program)
+        self.assertEqual(trees[0], Tree.load('r (d (e) d (e))'))
+        self.assertEqual(trees[1], Tree.load('d (e)'))
@@ -0,0 +1,22 @@
+import unittest
+from treepace.compiler import Compiler
+from treepace.search import memo_positions
+from treepace.stats import SearchStats
+from treepace.trees import Tree
+
+class TestMemoization(unittest.TestCase):
+    def test_memo_positions(self):
+        positions = lambda pattern: sorted(memo_positions(
+            Compiler.compile_pattern(pattern)))
+        self.assertEqual(positions('a < b < c, d'), [])
+        self.assertEqual(positions('a < b & c < d'), [7])
+        self.assertEqual(positions('a < b > < c'), [7])
+        self.assertEqual(positions('{a} < b & c < $1'), [])
+        self.assertEqual(positions('a < b & c < [group(1)]'), [])
+    
+    def test_failed_states(self):
+        tree = Tree.load('r (a b c d e)')
+        with SearchStats() as stats:
+            self.assertEqual(tree.search('r < . & . & [_ == "x"]'), [])
+        self.assertEqual(stats.instructions[-1].candidates, 5 * 4)
+        self.assertEqual(len(tree.search('r < . & . & .')), 5 * 4 * 4)
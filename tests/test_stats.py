@@ -0,0 +1,46 @@
+import threading
+import unittest
+from treepace.stats import SearchStats
+from treepace.trees import Tree
+
+class TestSearchStats(unittest.TestCase):
+    def test_counters(self):
+        tree = Tree.load('a (b (c) b (d) x)')
+        with SearchStats() as stats:
+            matches = tree.search('a < b < c')
+        self.assertEqual(len(matches), 1)
+        self.assertEqual((stats.searches, stats.matches), (1, 1))
+        finds = [entry for entry in stats.instructions
+                 if entry.instruction.startswith('FIND')]
+        self.assertEqual([entry.executions for entry in finds], [1, 1, 2])
+        self.assertEqual([entry.candidates for entry in finds], [6, 3, 2])
+        self.assertEqual([entry.branches_created for entry in finds],
+                         [1, 2, 1])
+        self.assertEqual([entry.branches_pruned for entry in finds],
+                         [0, 0, 1])
+        self.assertEqual(stats.peak_depth, 4)
+        
+        tree.search('a')
+        self.assertEqual(stats.searches, 1)
+        self.assertIsNone(SearchStats.active())
+    
+    def test_back_reference(self):
+        tree = Tree.load('r (a (b) a (b) a)')
+        with SearchStats() as stats:
+            expected = [str(m) for m in tree.search('{a < b}, $1')]
+            self.assertEqual([str(m) for m in tree.finditer('{a < b}, $1')],
+                             expected)
+        reference = stats.instructions[-1]
+        self.assertEqual(reference.instruction, 'SREF 1')
+        self.assertEqual(reference.expansions, reference.executions)
+        self.assertEqual(len(stats.instructions), 7)
+    
+    def test_thread_local(self):
+        active = []
+        thread = threading.Thread(target=lambda:
+                                  active.append(SearchStats.active()))
+        with SearchStats() as stats:
+            thread.start()
+            thread.join()
+            self.assertIs(SearchStats.active(), stats)
+        self.assertEqual(active, [None])
@@ -0,0 +1,49 @@
+import io
+import unittest
+from treepace.formats import XmlText
+from treepace.nodes import Node
+from treepace.stream import StreamError, XmlStream
+from treepace.trees import Tree
+
+class TestStream(unittest.TestCase):
+    XML = ('<r><a><b>x</b><c/></a><a><c><b/></c><b/></a>'
+           '<d><a><b><b/></b></a></d></r>')
+    
+    def test_search(self):
+        tree = Tree.load(self.XML, XmlText)
+        for pattern in ['a < b', 'b', 'a < c < b', 'a < c, b',
+                        'a < b < [_ == "x"]', '. < b < b']:
+            stream = XmlStream(pattern)
+            found = [str(m.group()) for m in
+                     stream.finditer(io.StringIO(self.XML))]
+            expected = [str(m.group()) for m in tree.search(pattern)]
+            self.assertEqual(sorted(found), sorted(expected), pattern)
+    
+    def test_eviction(self):
+        xml = '<r><d><a><b/></a></d>' + '<a><b/><c/></a>' * 5 + '</r>'
+        matches = list(XmlStream('a < b').finditer(xml))
+        self.assertEqual(len(matches), 6)
+        for match in matches:
+            a = match.group().root
+            self.assertIsNone(a.parent)
+            self.assertEqual(str(a.children[0]), 'b')
+    
+    def test_sibling_eviction(self):
+        class CountingNode(Node):
+            widest = 0
+            def insert_child(self, child, index):
+                super().insert_child(child, index)
+                CountingNode.widest = max(CountingNode.widest,
+                                          len(self.children))
+        
+        xml = '<r>' + '<a><b/></a>' * 100 + '</r>'
+        for pattern, count, widest in [('a, a, c', 0, 3), ('a < b', 100, 1),
+                                       ('a & c', 0, 100)]:
+            CountingNode.widest = 0
+            stream = XmlStream(pattern, CountingNode)
+            self.assertEqual(len(list(stream.finditer(xml))), count)
+            self.assertEqual(CountingNode.widest, widest, pattern)
+    
+    def test_unbounded(self):
+        self.assertRaises(StreamError, XmlStream, '{a} < $1')
+        self.assertRaises(StreamError, XmlStream, '[node.is_leaf]')
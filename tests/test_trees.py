@@ -1,5 +1,6 @@
 from re import sub
 import unittest
+from treepace.index import StructureIndex, ValueIndex
 from treepace.nodes import Node
 from treepace.trees import Subtree, SubtreeError, Tree
 
@@ -11,6 +12,56 @@ class TestTree(unittest.TestCase):
             self.assertEqual(match.group().to_tree(), expected)
             self.assertEqual(match.group(1).to_tree(), Tree.load('a'))
     
+    def test_search_groups(self):
+        tree = Tree.load('a (b (c d) b (e))')
+        matches = tree.search('{a} < {b < {.}}')
+        self.assertEqual([str(m) for m in matches],
+            ["['a (b (c))', 'a', 'b (c)', 'c']",
+             "['a (b (d))', 'a', 'b (d)', 'd']",
+             "['a (b (e))', 'a', 'b (e)', 'e']"])
+        self.assertIsNot(matches[0].group(2), matches[1].group(2))
+    
+    def test_finditer(self):
+        tree = Tree.load('a (b (c) b (d))')
+        matches = tree.finditer('b < .')
+        self.assertEqual(str(next(matches)), "['b (c)']")
+        self.assertEqual(str(next(matches)), "['b (d)']")
+        self.assertRaises(StopIteration, lambda: next(matches))
+        self.assertEqual(str(tree.first('b < d')), "['b (d)']")
+        self.assertIsNone(tree.first('c < .'))
+        self.assertTrue(tree.exists('a < b, b'))
+        self.assertFalse(tree.exists('a < d'))
+    
+    def test_axes(self):
+        tree = Tree.load('a (b (c (d) e) d (f))')
+        search = lambda pattern: [str(match.group())
+                                  for match in tree.search(pattern)]
+        self.assertEqual(search('a << d'), ['a (b (c (d)))', 'a (d)'])
+        self.assertEqual(search('c ^ a'), ['a (b (c))'])
+        self.assertEqual(str(tree.search('{b} << d ^ $1')[0]),
+                         "['b (c (d))', 'b']")
+        self.assertEqual(search('. < c ~ .'), ['b (c e)'])
+        self.assertEqual(search('. < e ; c'), ['b (c e)'])
+        self.assertEqual(search('. < d ; .'), ['a (b d)'])
+        tree.add_index(ValueIndex())
+        self.assertEqual(search('b << d'), ['b (c (d))'])
+        tree.add_index(StructureIndex())
+        self.assertEqual(search('b << d'), ['b (c (d))'])
+        self.assertEqual(search('a << . << d'), ['a (b (c (d)))'] * 2)
+    
+    def test_predicates(self):
+        tree = Tree.load('a (bb (c) d)')
+        count = lambda pattern, **variables: len(tree.search(pattern,
+                                                             **variables))
+        self.assertEqual(count('[len(_) == n  # comment]', n=2), 1)
+        self.assertEqual(count('[node.is_leaf and _ in [x for x in xs]]',
+                               xs='cd'), 2)
+        self.assertEqual(count('{.} < [group(1).root.value == "a"]'), 2)
+        self.assertEqual(count('[text(_)["xmltext"] == "d"]'), 1)
+        self.assertEqual(count('[text(_)]', text=lambda value: False), 0)
+        tree.replace('bb < c', '[$0 * n] < [node]', n=2, node='x')
+        self.assertEqual(tree, Tree.load('a (bbbb (x) d)'))
+    
     def test_match(self):
         tree = Tree.load('a (a (b c))')
         match = tree.match('a < a < c')[0].group().to_tree()
@@ -85,3 +136,10 @@ class TestSubtree(unittest.TestCase):
         connected = [tree.node('connected')]
         self.assertEqual(subtree.connected_leaves, connected)
         self.assertEqual(subtree.leaves, connected + [tree.node('leaf2')])
+    
+    def test_replace_by_one_node(self):
+        tree = Tree.load('a (b (c (d) e (f)) g)')
+        subtree = Subtree([tree.node(value) for value in 'abce'])
+        subtree.replace_by(Tree.load('x'))
+        self.assertEqual(tree, Tree.load('x (d f g)'))
+        self.assertEqual(subtree.nodes, {tree.root})
@@ -1,7 +1,12 @@
+__version__ = '0.3'
+
 from treepace.nodes import LogNode, Node
 from treepace.trees import Tree, Subtree
+from treepace.frozen import FrozenTree
 from treepace.formats import DotText, IndentedText, ParenText, XmlText
 from treepace.search import Match
+from treepace.stats import SearchStats
+from treepace.stream import XmlStream
 from treepace.utils import IPythonFormatter
 
 IPythonFormatter().register()
\ No newline at end of file
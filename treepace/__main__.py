@@ -0,0 +1,6 @@
+"""Run the command-line transformer: python -m treepace."""
+
+import sys
+from treepace.cli import main
+
+sys.exit(main())
@@ -1,6 +1,5 @@
 """Basic tree interface and behavior."""
 
-from itertools import chain
 from treepace.utils import EqualityMixin, IPythonDotMixin, ReprMixin
 
 class TreeBase(EqualityMixin, ReprMixin, IPythonDotMixin):
@@ -21,23 +20,37 @@ class TreeBase(EqualityMixin, ReprMixin, IPythonDotMixin):
         'a (b c)', the resulting sequence is node(a), down(), node(b), right(),
         node(c), up().
         """
-        def generate(context):
-            for item in node(context):
+        def generate():
+            for item in node(self._root):
                 yield item
-            children = self._node_children(context)
+            stack = []
+            children = tuple(self._node_children(self._root))
             if children:
                 for item in down():
                     yield item
-                for index, child in enumerate(children):
-                    if index != 0:
-                        for item in right():
-                            yield item
-                    for item in generate(child):
+                stack.append([iter(children), True])
+            
+            while stack:
+                frame = stack[-1]
+                child = next(frame[0], None)
+                if child is None:
+                    stack.pop()
+                    for item in up():
                         yield item
-                for item in up():
+                    continue
+                if not frame[1]:
+                    for item in right():
+                        yield item
+                frame[1] = False
+                for item in node(child):
                     yield item
+                children = tuple(self._node_children(child))
+                if children:
+                    for item in down():
+                        yield item
+                    stack.append([iter(children), True])
         
-        return generate(self._root)
+        return generate()
     
     def preorder(self):
         """Return a generator for pre-order tree traversal."""
@@ -52,11 +65,21 @@ class TreeBase(EqualityMixin, ReprMixin, IPythonDotMixin):
     @property
     def leaves(self):
         """Return all leaves of the subtree."""
-        def find_leaves(node):
-            children = list(self._node_children(node))
-            return chain(*map(find_leaves, children)) if children else [node]
-        
-        return list(find_leaves(self._root))
+        first_child = lambda node: next(iter(self._node_children(node)), None)
+        return [node for node in self.preorder() if first_child(node) is None]
+    
+    def _copy_nodes(self):
+        """Return a copy of the root node with copies of all its descendants
+        (new nodes with the same values)."""
+        root = self._root.copy_class(self._root.value)
+        stack = [(self._root, root)]
+        while stack:
+            node, copy = stack.pop()
+            for child in self._node_children(node):
+                child_copy = child.copy_class(child.value)
+                copy.add_child(child_copy)
+                stack.append((child, child_copy))
+        return root
     
     @property
     def inner(self):
@@ -14,6 +14,8 @@ class BuildMachine(ReprMixin):
         self.relation = None
         self.tree = None
         self.machine_vars = variables
+        # functions compiled from instruction expressions, by instruction id
+        self.functions = {}
     
     def __str__(self):
         """Return the machine state in a form of a string."""
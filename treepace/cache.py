@@ -0,0 +1,78 @@
+"""A persistent cache of compiled patterns, replacements and rules."""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import treepace
+
+# the version of the cached data; it must be incremented whenever
+# the attributes of pickled instructions or the compiled instruction
+# sequences change, even between releases (each release also has its own
+# entries, because the treepace version is a part of the key)
+FORMAT = 1
+
+class DiskCache:
+    """A directory of pickled instruction lists, keyed by the cache format,
+    the treepace version, the kind of the compiled text and the text
+    itself.
+    
+    Instructions are stored with their predicate sources, so the parser is
+    not used for cached texts. The entries are written atomically, so one
+    cache can be shared by concurrent processes. A cache which cannot be
+    read or written behaves as if it were empty.
+    """
+    
+    def __init__(self, directory):
+        """Use the given directory, creating it if it does not exist."""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def get(self, kind, text):
+        """Return the cached result of compiling the text or None if it is not
+        cached (or the entry is unreadable)."""
+        try:
+            with open(self._path(kind, text), 'rb') as file:
+                key, result = pickle.load(file)
+        except Exception:
+            return None
+        return result if key == self._key(kind, text) else None
+    
+    def put(self, kind, text, result):
+        """Store the result of compiling the text if the cache is writable."""
+        try:
+            fd, temporary = tempfile.mkstemp(dir=self.directory,
+                                             suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump((self._key(kind, text), result), file,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self._path(kind, text))
+        except Exception:
+            _discard(temporary)
+        except BaseException:
+            _discard(temporary)
+            raise
+    
+    def clear(self):
+        """Remove all entries."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                os.remove(os.path.join(self.directory, name))
+    
+    def _key(self, kind, text):
+        return (FORMAT, treepace.__version__, kind, text)
+    
+    def _path(self, kind, text):
+        digest = hashlib.sha256(repr(self._key(kind, text)).encode('utf-8'))
+        return os.path.join(self.directory, digest.hexdigest() + '.pickle')
+
+
+def _discard(path):
+    """Remove the file if it still exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,213 @@
+"""A command-line batch transformer applying a rule file to many files."""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import sys
+import tempfile
+import time
+from treepace.cache import DiskCache
+from treepace.compiler import Compiler
+from treepace.formats import IndentedText, ParenText, XmlText
+from treepace.program import Program
+from treepace.trees import Tree
+
+FORMATS = {'indented': IndentedText, 'paren': ParenText, 'xml': XmlText}
+
+# formats of input files detected by their extensions (the others are
+# considered parenthesized text); the first extension is used for outputs
+EXTENSIONS = {'indented': ['.txt', '.indented'], 'paren': ['.paren'],
+              'xml': ['.xml']}
+
+def main(argv=None):
+    """Transform the files given by command-line arguments and return
+    the exit status."""
+    args = _parse_args(argv)
+    with open(args.rules, encoding='utf-8') as file:
+        rules = file.read()
+    jobs = [_job(path, base, args) for path, base in _input_files(args.inputs)]
+    
+    start = time.perf_counter()
+    executor = None
+    if args.jobs == 1:
+        _init_worker(rules, args.cache)
+        results = map(_transform_file, jobs)
+    else:
+        executor = ProcessPoolExecutor(args.jobs, initializer=_init_worker,
+                                       initargs=(rules, args.cache))
+        results = executor.map(_transform_file, jobs)
+    
+    latencies, node_count, failed = [], 0, 0
+    try:
+        for job, (output, nodes, seconds, error) in zip(jobs, results):
+            if error is not None:
+                print("%s: %s" % (job[0], error), file=sys.stderr)
+                failed += 1
+                continue
+            if output is not None:
+                sys.stdout.write(output)
+            latencies.append(seconds)
+            node_count += nodes
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+    
+    if not args.quiet:
+        _print_summary(latencies, failed, node_count, elapsed)
+    return 1 if failed else 0
+
+
+def _parse_args(argv):
+    """Return the parsed command-line arguments."""
+    parser = argparse.ArgumentParser(prog='treepace',
+        description="Apply transformation rules (one 'pattern -> "
+                    "replacement' per line) to tree files.")
+    parser.add_argument('rules', help="the file containing the rules")
+    parser.add_argument('inputs', nargs='+', metavar='input',
+        help="an input file or a directory searched recursively for files "
+             "with known extensions")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help="the number of worker processes (0 means one per CPU)")
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS),
+        help="the input format (detected by the extension by default)")
+    parser.add_argument('-t', '--to', choices=sorted(FORMATS),
+        help="the output format (the input one by default)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('-o', '--output-dir',
+        help="write the results to this directory instead of the standard "
+             "output, keeping the paths relative to input directories")
+    output.add_argument('-i', '--in-place', action='store_true',
+        help="overwrite the input files with the results")
+    parser.add_argument('--cache', metavar='DIR',
+        help="keep the compiled rules in this directory between runs")
+    parser.add_argument('-q', '--quiet', action='store_true',
+        help="do not print the summary to the standard error")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("the number of jobs must not be negative")
+    args.jobs = args.jobs or os.cpu_count() or 1
+    if args.in_place and args.to:
+        parser.error("the output format cannot be changed in place")
+    return args
+
+
+def _input_files(inputs):
+    """Generate (path, base directory) pairs of the files to transform;
+    the base is None for files given directly."""
+    known = tuple(extension for extensions in EXTENSIONS.values()
+                  for extension in extensions)
+    for path in inputs:
+        if not os.path.isdir(path):
+            yield path, None
+            continue
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(files):
+                if name.endswith(known):
+                    yield os.path.join(directory, name), path
+
+
+def _job(path, base, args):
+    """Return a (path, input format, output format, output path, inline)
+    tuple describing the transformation of one file."""
+    in_format = args.format or _detect_format(path)
+    out_format = args.to or in_format
+    if args.in_place:
+        return (path, in_format, out_format, path, False)
+    elif args.output_dir is not None:
+        if base is None:
+            relative = os.path.basename(path)
+        else:
+            relative = os.path.relpath(path, base)
+        if args.to:
+            extension = EXTENSIONS[out_format][0]
+            relative = os.path.splitext(relative)[0] + extension
+        return (path, in_format, out_format,
+                os.path.join(args.output_dir, relative), False)
+    else:
+        return (path, in_format, out_format, None, True)
+
+
+def _detect_format(path):
+    """Return the name of the format of the file according to its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    for name, extensions in EXTENSIONS.items():
+        if extension in extensions:
+            return name
+    return 'paren'
+
+
+# the program compiled once in each worker process
+_program = None
+
+def _init_worker(rules, cache_directory):
+    """Compile the rules in the current process, using the disk cache
+    if its directory is given."""
+    global _program
+    if cache_directory is not None:
+        Compiler.set_cache(DiskCache(cache_directory))
+    _program = Program(rules)
+
+
+def _transform_file(job):
+    """Load, transform and save one file; return a tuple of the output string
+    (if it is not written to a file), the number of input nodes, the elapsed
+    time and an error message (or None)."""
+    path, in_format, out_format, out_path, inline = job
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as file:
+            tree = Tree.load(file, FORMATS[in_format])
+        nodes = sum(1 for _ in tree.preorder())
+        tree.transform(_program)
+        # only the parenthesized text does not end with a newline
+        newline = '\n' if out_format == 'paren' else ''
+        if inline:
+            output = tree.save(FORMATS[out_format]) + newline
+        else:
+            output = None
+            def write(file):
+                tree.save_to(file, FORMATS[out_format])
+                file.write(newline)
+            _write_atomically(out_path, write)
+    except Exception as e:
+        return (None, 0, 0, "%s: %s" % (type(e).__name__, e))
+    return (output, nodes, time.perf_counter() - start, None)
+
+
+def _write_atomically(path, write):
+    """Call the function with a temporary file in the directory of the path
+    and then rename the file to the path, so an existing file (possibly
+    the input) is replaced only by a complete output."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory or '.', suffix='.tmp',
+                                     prefix='.' + os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            write(file)
+        if os.path.exists(path):
+            shutil.copymode(path, temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def _print_summary(latencies, failed, node_count, elapsed):
+    """Print the throughput and per-file latency statistics."""
+    count = len(latencies)
+    rate = lambda amount: amount / elapsed if elapsed else float('inf')
+    print("%d files transformed, %d failed, %d nodes in %.3f s "
+          "(%.1f files/s, %.0f nodes/s)" % (count, failed, node_count,
+          elapsed, rate(count), rate(node_count)), file=sys.stderr)
+    if latencies:
+        latencies.sort()
+        percentile = lambda p: latencies[min(count - 1, int(p * count))]
+        print("latency: mean %.1f ms, median %.1f ms, p95 %.1f ms, "
+              "max %.1f ms" % (1000 * sum(latencies) / count,
+              1000 * percentile(0.5), 1000 * percentile(0.95),
+              1000 * latencies[-1]), file=sys.stderr)
@@ -19,7 +19,7 @@ class GuiNode(Node):
         self.tv.see(self.id)
         self.tv.selection_set(self.id)
         self._pause()
-        self._value = _value
+        Node.value.fset(self, _value)
         self.tv.item(self.id, text=str(_value))
         self._pause()
     
@@ -41,7 +41,7 @@ class GuiNode(Node):
     
     def __del__(self):
         try:
-            if self.parent and not self._children:
+            if self.parent and self.is_leaf:
                 self.tv.delete(self.id)
         except Exception:
             pass
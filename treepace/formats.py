@@ -5,26 +5,54 @@ In contrast to resource-mapping, importing/exporting loads and saves trees to
 their external representation on demand, not after every change.
 """
 
-import json
+import codecs
 import math
 import re
-import textwrap
 import treepace.trees
-from xml.dom import minidom
-from xml.etree import ElementTree
 
-class IndentedText:
+class Format:
+    """A base class of tree formats which export trees as a sequence of text
+    chunks, so the whole output does not have to be held in memory."""
+    
+    def chunks(self, tree, *args, **kwargs):
+        """Generate the text chunks representing the tree."""
+        raise NotImplementedError
+    
+    def save_tree(self, tree, *args, **kwargs):
+        """Create a string from the tree."""
+        return ''.join(self.chunks(tree, *args, **kwargs))
+    
+    def save_to(self, tree, file, *args, **kwargs):
+        """Write the tree to a text file in one pass, using a small buffer."""
+        buffer, size = [], 0
+        for chunk in self.chunks(tree, *args, **kwargs):
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= 65536:
+                file.write(''.join(buffer))
+                buffer, size = [], 0
+        file.write(''.join(buffer))
+
+
+class IndentedText(Format):
     """A text where the indentation level determines the node level."""
     
-    def load_tree(self, string, node_class):
-        """Create a tree from the tab- or space-indented string.
+    def load_tree(self, source, node_class):
+        """Create a tree from the tab- or space-indented string or file.
         
-        The indentation type is automatically recognized.
+        The indentation type is automatically recognized. The indentation
+        of the first line is removed from all lines.
         """
         indent_len = None
+        margin = None
         stack = []
         
-        for line in filter(str.strip, textwrap.dedent(string).splitlines()):
+        for line in filter(str.strip, _read_lines(source)):
+            if margin is None:
+                margin = line[:len(line) - len(line.lstrip())]
+            if not line.startswith(margin):
+                raise InvalidFormatError("Line indented less than the root")
+            line = line[len(margin):]
             value = line.lstrip()
             spaces = len(line) - len(value)
             if spaces and not indent_len:
@@ -39,106 +67,179 @@ class IndentedText:
                 raise InvalidFormatError("Level too large")
             if level > 0:
                 stack[-2].add_child(stack[-1])
+        if not stack:
+            raise InvalidFormatError("No root node")
         return stack[0]
     
-    def save_tree(self, tree, indent='    '):
-        """Create a space- or tab-indented string from the tree."""
-        def indented(node, level):
-            result = level * indent + str(node) + '\n'
-            for child in node.children:
-                result += indented(child, level + 1)
-            return result
-        
-        return indented(tree, 0)
+    def chunks(self, tree, indent='    '):
+        """Generate space- or tab-indented lines representing the tree."""
+        stack = [(tree, 0)]
+        while stack:
+            node, level = stack.pop()
+            yield level * indent + str(node) + '\n'
+            stack.extend((child, level + 1) for child in reversed(node.children))
 
 
-class ParenText:
+class ParenText(Format):
     """A text starting with a root node, followed by children enclosed
     in parentheses and siblings divided by spaces."""
     
-    def load_tree(self, string, node_class):
-        """Create a tree from the parenthesized string."""
-        tokens = re.findall(r'\(|\)|[^\(\)\s]+', string)
-        root = node_class(tokens.pop(0))
-        
-        def parse(node):
-            while tokens:
-                token = tokens.pop(0)
-                if token == '(':
-                    if not node.children:
-                        raise InvalidFormatError("Unexpected '('")
-                    parse(node.children[-1])
-                elif token == ')':
-                    return
-                else:
-                    node.add_child(node_class(token))
+    def load_tree(self, source, node_class):
+        """Create a tree from the parenthesized string or file."""
+        tokens = _paren_tokens(_read_text(source))
+        token = next(tokens, None)
+        if token is None:
+            raise InvalidFormatError("No root node")
+        root = node_class(token)
         
-        if tokens and tokens.pop(0) != '(':
+        if next(tokens, '(') != '(':
             raise InvalidFormatError("Multiple root nodes")
-        parse(root)
+        stack = [root]
+        last_child = None
+        for token in tokens:
+            if token == '(':
+                if last_child is None:
+                    raise InvalidFormatError("Unexpected '('")
+                stack.append(last_child)
+                last_child = None
+            elif token == ')':
+                if len(stack) == 1:
+                    break
+                last_child = stack.pop()
+            else:
+                last_child = node_class(token)
+                stack[-1].add_child(last_child)
         return root
     
-    def save_tree(self, tree):
-        """Create a parenthesized string from the tree."""
-        result = str(tree)
-        if tree.children:
-            for i, child in enumerate(tree.children):
-                result += (' (' if i == 0 else ' ') + self.save_tree(child)
-            result += ')'
-        
-        return result
+    def chunks(self, tree):
+        """Generate the parts of a parenthesized string representing
+        the tree."""
+        subtree = treepace.trees.Tree(tree)
+        return subtree.traverse(lambda node: [str(node)], lambda: [' ('],
+                                lambda: [' '], lambda: [')'])
 
 
-class XmlText:
+class XmlText(Format):
     """A string containing an XML document."""
     
-    def load_tree(self, string, node_class):
-        """Create a tree from the XML string."""
-        doc = ElementTree.fromstring(string)
-        node = node_class(doc.tag)
+    def load_tree(self, source, node_class):
+        """Create a tree from the XML string or file.
         
-        def load(doc, node):
-            for elem in doc:
-                new_node = node_class(elem.tag)
-                node.add_child(new_node)
-                for attr in elem.attrib:
-                    new_node.add_child(node_class({attr: elem.attrib[attr]}))
-                if elem.text and not elem.text.isspace():
-                    new_node.add_child(node_class({'xmltext': elem.text}))
-                load(elem, new_node)
-                if elem.tail and not elem.tail.isspace():
-                    tail = node_class({'xmltext': elem.tail})
-                    new_node.parent.add_child(tail)
-        
-        load(doc, node)
-        return node
+        The document is parsed incrementally and the processed elements are
+        discarded, so only the created nodes are held in memory.
+        """
+        root = None
+        for _, node in self.parse_events(source, node_class):
+            if root is None:
+                root = node
+        return root
     
-    def save_tree(self, tree):
-        """Create an XML string from the tree."""
-        doc = ElementTree.Element(str(tree))
+    def parse_events(self, source, node_class):
+        """Parse the XML string or file incrementally and generate pairs
+        ('start', node) and ('end', node).
         
-        def save(node, doc):
-            sub = None
-            for child in node.children:
-                if isinstance(child.value, dict):
-                    for key, value in child.value.items():
-                        if key == 'xmltext':
-                            if sub is None:
-                                doc.text = value
-                            else:
-                                sub.tail = value
-                        else:
-                            doc.attrib[key] = value
-                else:
-                    sub = ElementTree.SubElement(doc, str(child))
-                    save(child, sub)
+        Each node is added to its parent before its start event. Attribute
+        and text nodes are leaves whose end event immediately follows
+        the start event.
+        """
+        from xml.etree import ElementTree
+        parser = ElementTree.XMLPullParser(('start', 'end'))
+        # [element, node, text was added, last closed child element]
+        stack = []
+        
+        for chunk in _read_chunks(source):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if stack:
+                    for item in self._flush_texts(stack[-1], node_class):
+                        yield item
+                if event == 'end':
+                    closed = stack.pop()
+                    if stack:
+                        stack[-1][3] = closed[0]
+                    yield ('end', closed[1])
+                    continue
+                node = node_class(elem.tag)
+                if stack:
+                    stack[-1][1].add_child(node)
+                yield ('start', node)
+                if stack:
+                    for attr in elem.attrib:
+                        value = {attr: elem.attrib[attr]}
+                        for item in self._leaf(node, value, node_class):
+                            yield item
+                stack.append([elem, node, not stack, None])
+        parser.close()
+    
+    def _flush_texts(self, entry, node_class):
+        """Add the text of the element and the tail of its last closed child
+        (both are complete when the next event occurs), generate their
+        events and discard the closed children."""
+        elem, node, text_added, closed = entry
+        texts = []
+        if not text_added:
+            texts.append(elem.text)
+            entry[2] = True
+        if closed is not None:
+            texts.append(closed.tail)
+            entry[3] = None
+            del elem[:]
+        for text in texts:
+            if text and not text.isspace():
+                for item in self._leaf(node, {'xmltext': text}, node_class):
+                    yield item
+    
+    @staticmethod
+    def _leaf(parent, value, node_class):
+        node = node_class(value)
+        parent.add_child(node)
+        yield ('start', node)
+        yield ('end', node)
+    
+    def chunks(self, tree, indent='    '):
+        """Generate lines of an indented XML document representing the tree.
         
-        save(tree, doc)
-        xml_str = ElementTree.tostring(doc, encoding='unicode')
-        return minidom.parseString(xml_str).documentElement.toprettyxml('    ')
+        Elements containing only one text are written on a single line.
+        """
+        stack = [(tree, 0)]
+        while stack:
+            item, level = stack.pop()
+            if isinstance(item, str):
+                yield level * indent + item + '\n'
+                continue
+            attrs, content = self._element_parts(item)
+            start = level * indent + '<' + str(item) + ''.join(
+                ' %s="%s"' % (key, _escape(value)) for key, value in attrs)
+            if not content:
+                yield start + '/>\n'
+            elif len(content) == 1 and isinstance(content[0], str):
+                yield '%s>%s</%s>\n' % (start, _escape(content[0]), item)
+            else:
+                yield start + '>\n'
+                stack.append((level * indent + '</%s>' % item, 0))
+                stack.extend((part if not isinstance(part, str)
+                              else _escape(part), level + 1)
+                             for part in reversed(content))
+    
+    @staticmethod
+    def _element_parts(node):
+        """Return a list of attribute (name, value) pairs and a list of texts
+        and child element nodes in the document order."""
+        attrs = {}
+        content = [None]
+        for child in node.children:
+            if isinstance(child.value, dict):
+                for key, value in child.value.items():
+                    if key == 'xmltext':
+                        content[-1] = value
+                    else:
+                        attrs[key] = value
+            else:
+                content.extend((child, None))
+        return list(attrs.items()), [part for part in content if part]
 
 
-class DotText:
+class DotText(Format):
     """A string in DOT graph description language, used by Graphviz."""
     
     TEMPLATE = re.sub(r'\s+', '', '''digraph {
@@ -150,9 +251,11 @@ class DotText:
     EDGE_TPL = 'n%d->n%d%s;'
     CLUSTER_TPL = 'subgraph cluster_%d{label=%d;fontsize=9;style=dashed;'
     
-    def save_tree(self, tree, subtree=None, match=None, groups=[]):
+    def chunks(self, tree, subtree=None, match=None, groups=[]):
         """Generate the DOT language source text containing nodes and edges."""
-        result= ''
+        import json
+        header, footer = self.TEMPLATE.split('%s')
+        yield header
         nodes = {}
         
         for index, node in enumerate(treepace.trees.Tree(tree).preorder()):
@@ -162,7 +265,7 @@ class DotText:
                 color = ',color="#3567A7",fillcolor="#B9D8FF"'
             elif match and node in match.group().nodes:
                 color = ',color="#5D8C55",fillcolor="#A7FF99"'
-            result += self.NODE_TPL % (index, json.dumps(str(node)), color)
+            yield self.NODE_TPL % (index, json.dumps(str(node)), color)
         
         for node, index in nodes.items():
             if node.parent:
@@ -171,22 +274,83 @@ class DotText:
                     color = '[color="#3567A7"]'
                 elif match and {node.parent, node} <= match.group().nodes:
                     color = '[color="#5D8C55"]'
-                result += self.EDGE_TPL % (nodes[node.parent], index, color)
+                yield self.EDGE_TPL % (nodes[node.parent], index, color)
         
-        def cluster(groups, idx):
-            code = self.CLUSTER_TPL % (idx, idx)
-            code += ''.join('n%d;' % nodes[node] for node in groups[idx].nodes)
-            if len(groups) > idx + 1:
-                if groups[idx].nodes & groups[idx + 1].nodes:
-                    return code + cluster(groups, idx + 1) + '}'
+        if match and len(match.groups()) > 1:
+            # a cluster overlapping with the next one encloses all following
+            # clusters
+            match_groups = [group.nodes for group in match.groups()]
+            unclosed = 0
+            for idx in range(1, len(match_groups)):
+                yield self.CLUSTER_TPL % (idx, idx)
+                yield ''.join('n%d;' % nodes[node] for node in match_groups[idx])
+                following = match_groups[idx + 1:idx + 2]
+                if following and match_groups[idx] & following[0]:
+                    unclosed += 1
                 else:
-                    return code + '}' + cluster(groups, idx + 1)
+                    yield '}'
+            yield '}' * unclosed
+        yield footer
+
+
+def _read_chunks(source, size=65536):
+    """Generate chunks of a string, a text or binary file or a memory-mapped
+    file."""
+    if isinstance(source, (str, bytes)):
+        yield source
+        return
+    chunk = source.read(size)
+    while chunk:
+        yield chunk
+        chunk = source.read(size)
+
+
+def _read_text(source):
+    """Generate text chunks of the source, decoding binary data as UTF-8."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in _read_chunks(source):
+        yield chunk if isinstance(chunk, str) else decoder.decode(chunk)
+    yield decoder.decode(b'', True)
+
+
+def _read_lines(source):
+    """Generate the lines of the source without line endings."""
+    rest = ''
+    for chunk in _read_text(source):
+        lines = (rest + chunk).splitlines(True)
+        rest = ''
+        if lines and lines[-1].splitlines()[0] == lines[-1]:
+            rest = lines.pop()
+        for line in lines:
+            yield line.splitlines()[0]
+    if rest:
+        yield rest
+
+
+def _paren_tokens(chunks):
+    """Generate the tokens of a parenthesized text -- parentheses and
+    values."""
+    rest = ''
+    for chunk in chunks:
+        text, rest = rest + chunk, ''
+        for match in _PAREN_TOKEN.finditer(text):
+            token = match.group()
+            if match.end() == len(text) and token not in '()':
+                rest = token
             else:
-                return code + '}'
-        
-        if match and len(match.groups()) > 1:
-            result += cluster(match.groups(), 1)
-        return self.TEMPLATE % result
+                yield token
+    if rest:
+        yield rest
+
+
+_PAREN_TOKEN = re.compile(r'\(|\)|[^\(\)\s]+')
+
+
+def _escape(text):
+    """Escape the characters which are not allowed in XML texts and attribute
+    values."""
+    return (text.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;').replace('>', '&gt;'))
 
 
 class InvalidFormatError(Exception):
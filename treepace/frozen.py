@@ -0,0 +1,197 @@
+"""A compact, read-only tree representation stored in parallel arrays."""
+
+from array import array
+from treepace.formats import ParenText
+from treepace.nodes import Node
+from treepace.trees import SearchableTree, Tree
+from treepace.utils import IPythonDotMixin, ReprMixin
+
+class FrozenTree(SearchableTree):
+    """An immutable tree whose structure is stored in integer arrays.
+    
+    Nodes are numbered in pre-order. For each node number, the arrays contain
+    the number of its parent, first child and next sibling (or -1) and its
+    value. Node objects are lightweight proxies created on demand.
+    """
+    
+    def __init__(self, parents, first_children, next_siblings, values):
+        """Initialize the tree with the columns (sequences indexed by
+        pre-order node numbers)."""
+        self._parents = parents
+        self._first_children = first_children
+        self._next_siblings = next_siblings
+        self._values = values
+        self._root = FrozenNode(self, 0)
+    
+    @classmethod
+    def from_tree(cls, tree):
+        """Create a frozen copy of the given tree (or subtree)."""
+        parents, first_children = array('i'), array('i')
+        next_siblings, last_children = array('i'), array('i')
+        values = []
+        stack = [(tree.root, -1)]
+        
+        while stack:
+            node, parent = stack.pop()
+            number = len(values)
+            values.append(node.value)
+            parents.append(parent)
+            first_children.append(-1)
+            next_siblings.append(-1)
+            last_children.append(-1)
+            if parent != -1:
+                if last_children[parent] == -1:
+                    first_children[parent] = number
+                else:
+                    next_siblings[last_children[parent]] = number
+                last_children[parent] = number
+            children = tree._node_children(node)
+            stack.extend((child, number) for child in reversed(list(children)))
+        
+        return cls(parents, first_children, next_siblings, values)
+    
+    @classmethod
+    def load(cls, source, fmt=ParenText, node_class=Node, *args, **kwargs):
+        """Create a new frozen tree by importing it from a string or a file
+        in a given format."""
+        return cls.from_tree(Tree.load(source, fmt, node_class, *args,
+                                       **kwargs))
+    
+    def to_tree(self, node_class=Node):
+        """Return a mutable tree consisting of new nodes of the given class."""
+        nodes = []
+        for number, value in enumerate(self._values):
+            node = node_class(value)
+            if number != 0:
+                nodes[self._parents[number]].add_child(node)
+            nodes.append(node)
+        return Tree(nodes[0])
+    
+    def preorder(self):
+        """Return a generator for pre-order tree traversal."""
+        return (FrozenNode(self, number) for number in range(len(self)))
+    
+    def __len__(self):
+        """Return the number of nodes."""
+        return len(self._values)
+
+
+class FrozenNode(ReprMixin, IPythonDotMixin):
+    """A read-only proxy for one node of a frozen tree.
+    
+    Two proxies are equal if they represent the same node.
+    """
+    
+    __slots__ = ('_tree', '_number')
+    
+    # copies of frozen nodes are ordinary mutable nodes
+    copy_class = Node
+    
+    def __init__(self, tree, number):
+        """Create a proxy for the node with the given pre-order number."""
+        self._tree = tree
+        self._number = number
+    
+    @property
+    def value(self):
+        """Return this node's value."""
+        return self._tree._values[self._number]
+    
+    @property
+    def parent(self):
+        """Return the parent node."""
+        return self._proxy(self._tree._parents[self._number])
+    
+    @property
+    def children(self):
+        """Return a tuple containing the child nodes."""
+        return tuple(self._child_numbers())
+    
+    @property
+    def next_sibling(self):
+        """Return the immediately following sibling or None."""
+        return self._proxy(self._tree._next_siblings[self._number])
+    
+    @property
+    def previous_sibling(self):
+        """Return the immediately preceding sibling or None."""
+        parent = self._tree._parents[self._number]
+        if parent == -1:
+            return None
+        sibling = self._tree._first_children[parent]
+        if sibling == self._number:
+            return None
+        while self._tree._next_siblings[sibling] != self._number:
+            sibling = self._tree._next_siblings[sibling]
+        return FrozenNode(self._tree, sibling)
+    
+    @property
+    def index(self):
+        """Return a zero-based order of this node among its siblings."""
+        parent = self._tree._parents[self._number]
+        if parent == -1:
+            return 0
+        sibling = self._tree._first_children[parent]
+        index = 0
+        while sibling != self._number:
+            sibling = self._tree._next_siblings[sibling]
+            index += 1
+        return index
+    
+    @property
+    def level(self):
+        """Return this node's vertical level; the root node has a level of 0."""
+        level = 0
+        number = self._tree._parents[self._number]
+        while number != -1:
+            level += 1
+            number = self._tree._parents[number]
+        return level
+    
+    @property
+    def is_leaf(self):
+        return self._tree._first_children[self._number] == -1
+    
+    def path(self):
+        """Return a list of node values from the root to this node."""
+        result = []
+        node = self
+        while node:
+            result.append(str(node.value))
+            node = node.parent
+        result.reverse()
+        return result
+    
+    def str_path(self):
+        """Return a slash-separated path from the root node to this node."""
+        return "/".join(self.path())
+    
+    def _child_numbers(self):
+        number = self._tree._first_children[self._number]
+        while number != -1:
+            yield FrozenNode(self._tree, number)
+            number = self._tree._next_siblings[number]
+    
+    def _proxy(self, number):
+        return FrozenNode(self._tree, number) if number != -1 else None
+    
+    def __eq__(self, other):
+        """Compare the tree and the node number."""
+        return (isinstance(other, FrozenNode) and self._tree is other._tree
+                and self._number == other._number)
+    
+    def __ne__(self, other):
+        """Just a negation of the equality result."""
+        return not self.__eq__(other)
+    
+    def __hash__(self):
+        """Return a hash of the node number."""
+        return hash(self._number)
+    
+    def __str__(self):
+        """Return a string representation of the node's value."""
+        return str(self.value)
+    
+    def _repr_dot_(self):
+        from treepace.formats import DotText
+        return DotText().save_tree(Node(self.value))
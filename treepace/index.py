@@ -0,0 +1,284 @@
+"""Optional tree indexes which are kept up to date by the nodes and used
+to speed up searching."""
+
+class TreeIndex:
+    """An abstract index attached to all nodes of a tree.
+    
+    Each node holds a tuple of indexes of its tree and notifies them about
+    changes of its value and inserted or detached subtrees.
+    """
+    
+    @classmethod
+    def of(cls, node):
+        """Return the index of this class attached to the node, or None."""
+        for index in getattr(node, '_indexes', ()):
+            if isinstance(index, cls):
+                return index
+        return None
+    
+    def insert(self, node):
+        """Register the node and all its descendants."""
+        for descendant in subtree_nodes(node):
+            self.add(descendant)
+    
+    def remove(self, node):
+        """Unregister the node and all its descendants."""
+        for descendant in subtree_nodes(node):
+            self.discard(descendant)
+    
+    def update(self, node):
+        """Called when the value of the node was changed."""
+        pass
+
+
+class ValueIndex(TreeIndex):
+    """An inverted index from string representations of node values
+    to nodes.
+    
+    Node values which are modified in place (not using the 'value' setter)
+    are not re-indexed.
+    
+    The nodes with one value are sorted in document order when they are
+    first requested after a change, so if the tree has a StructureIndex,
+    the nodes in a subtree are found by binary search.
+    """
+    
+    def __init__(self):
+        """Create an empty index."""
+        self._nodes = {}
+        self._keys = {}
+        self._ordered = {}
+    
+    def add(self, node):
+        """Register one node (again if it was moved)."""
+        key = str(node.value)
+        self._keys[node] = key
+        self._nodes.setdefault(key, {})[node] = None
+        self._ordered.pop(key, None)
+    
+    def discard(self, node):
+        """Unregister one node if it is present."""
+        key = self._keys.pop(node, None)
+        if key is not None:
+            self._ordered.pop(key, None)
+            nodes = self._nodes[key]
+            del nodes[node]
+            if not nodes:
+                del self._nodes[key]
+    
+    def update(self, node):
+        """Move the node under its new value."""
+        self.discard(node)
+        self.add(node)
+    
+    def count(self, value):
+        """Return the number of nodes whose value is equal to the given one
+        (using string comparison)."""
+        return len(self._nodes.get(str(value), ()))
+    
+    def find(self, value, root=None):
+        """Return a list of nodes with the given value (using string
+        comparison) in document order.
+        
+        If a root is given, only this node and its descendants are returned.
+        """
+        key = str(value)
+        nodes = self._ordered.get(key)
+        if nodes is None:
+            nodes = document_order(self._nodes.get(key, ()))
+            self._ordered[key] = nodes
+        if root is None or root.parent is None:
+            return list(nodes)
+        
+        structure = StructureIndex.of(root)
+        if structure is not None and root in structure:
+            start, end = structure.interval(root)
+            return nodes[_bisect(nodes, start, structure):
+                         _bisect(nodes, end, structure)]
+        return [node for node in nodes if is_ancestor(root, node)]
+    
+    def __len__(self):
+        """Return the number of indexed nodes."""
+        return len(self._keys)
+
+
+class StructureIndex(TreeIndex):
+    """Nested-interval numbering of nodes.
+    
+    Each node has a (start, end) pair of numbers: the starts increase
+    in pre-order, the ends in post-order and the interval of a node
+    contains the intervals of all its descendants. Ancestor tests and
+    document ordering are therefore comparisons of numbers.
+    
+    Gaps are left between the numbers, so an inserted subtree is usually
+    numbered without changing the other nodes. When a gap is exhausted,
+    a growing window of siblings (and ancestors) is renumbered, requiring
+    more free numbers per node the larger the window is, so repeated
+    insertions at one place renumber large parts of the tree rarely.
+    """
+    
+    GAP = 1 << 16
+    MIN_GAP = 16
+    
+    def __init__(self):
+        """Create an empty index."""
+        self._starts = {}
+        self._ends = {}
+    
+    def insert(self, node):
+        """Number the node and its descendants; a node which was moved
+        within the tree is numbered again.
+        
+        If there are not enough free numbers around the node, a window of
+        its siblings, doubled until it has enough free numbers, is
+        renumbered. If all the siblings do not fit, the parent is included
+        in a window of its siblings, and so on.
+        """
+        if node in self._starts:
+            self.remove(node)
+        size = _count(node)
+        minimum = 1
+        while True:
+            parent = node.parent
+            if parent is None or parent not in self._starts:
+                step = max(self.GAP, minimum)
+                self._number(node, node, size, 0, step * (2 * size + 1))
+                return
+            first = last = node
+            width = 1
+            while True:
+                before, after = first.previous_sibling, last.next_sibling
+                low = self._ends[before] if before else self._starts[parent]
+                high = self._starts[after] if after else self._ends[parent]
+                if (high - low) // (2 * size + 1) >= minimum:
+                    self._number(first, last, size, low, high)
+                    return
+                if before is None and after is None:
+                    break
+                minimum = max(self.MIN_GAP, 2 * minimum)
+                for _ in range(width):
+                    if first.previous_sibling is not None:
+                        first = first.previous_sibling
+                        size += _count(first)
+                    if last.next_sibling is not None:
+                        last = last.next_sibling
+                        size += _count(last)
+                width *= 2
+            node, size = parent, size + 1
+            minimum = max(self.MIN_GAP, 2 * minimum)
+    
+    def discard(self, node):
+        """Remove the numbers of one node if it is present."""
+        self._starts.pop(node, None)
+        self._ends.pop(node, None)
+    
+    def is_ancestor(self, ancestor, node):
+        """Return True if the first node is an ancestor of the second one
+        or if they are the same node."""
+        return (self._starts[ancestor] <= self._starts[node]
+                and self._ends[node] <= self._ends[ancestor])
+    
+    def position(self, node):
+        """Return a number which increases in document order."""
+        return self._starts[node]
+    
+    def interval(self, node):
+        """Return the (start, end) pair of the node; the positions of its
+        descendants are between them."""
+        return (self._starts[node], self._ends[node])
+    
+    def __contains__(self, node):
+        """Return True if the node is numbered."""
+        return node in self._starts
+    
+    def __len__(self):
+        """Return the number of numbered nodes."""
+        return len(self._starts)
+    
+    def _number(self, first, last, size, low, high):
+        """Spread the numbers of the siblings from the first to the last one
+        and of their descendants (size nodes in total) evenly between the low
+        and high number."""
+        nodes = [first]
+        while nodes[-1] is not last:
+            nodes.append(nodes[-1].next_sibling)
+        step = (high - low) // (2 * size + 1)
+        number = low
+        stack = [(node, False) for node in reversed(nodes)]
+        while stack:
+            current, finished = stack.pop()
+            number += step
+            if finished:
+                self._ends[current] = number
+            else:
+                self._starts[current] = number
+                stack.append((current, True))
+                stack.extend((child, False)
+                             for child in reversed(current.children))
+
+
+def subtree_nodes(node):
+    """Generate the node and its descendants in pre-order."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+
+def is_ancestor(ancestor, node):
+    """Return True if the first node is an ancestor of the second one
+    or if they are the same node.
+    
+    A StructureIndex of the tree is used if both nodes are numbered by it.
+    """
+    structure = StructureIndex.of(node)
+    if structure is not None and ancestor in structure:
+        return structure.is_ancestor(ancestor, node)
+    while node is not None:
+        if node == ancestor:
+            return True
+        node = node.parent
+    return False
+
+
+def document_order(nodes):
+    """Return a list of the nodes sorted in pre-order, comparing their
+    numbers if they are all numbered by a StructureIndex."""
+    nodes = list(nodes)
+    structure = StructureIndex.of(nodes[0]) if nodes else None
+    if structure is not None and all(node in structure for node in nodes):
+        return sorted(nodes, key=structure.position)
+    return sorted(nodes, key=document_position)
+
+
+def _bisect(nodes, number, structure):
+    """Return the index of the first node in the list (sorted in document
+    order) whose position is not lower than the number."""
+    low, high = 0, len(nodes)
+    while low < high:
+        middle = (low + high) // 2
+        if structure.position(nodes[middle]) < number:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _count(node):
+    count = 0
+    stack = [node]
+    while stack:
+        count += 1
+        stack.extend(stack.pop().children)
+    return count
+
+
+def document_position(node):
+    """Return a sort key representing the pre-order position of the node."""
+    position = []
+    while node.parent is not None:
+        position.append(node.index)
+        node = node.parent
+    position.reverse()
+    return position
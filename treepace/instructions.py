@@ -1,6 +1,8 @@
 """Virtual machine instructions."""
 
+from functools import lru_cache
 from re import sub
+from treepace.index import ValueIndex
 from treepace.relations import Child, NextSibling, Parent
 import treepace.trees
 from treepace.utils import EqualityMixin, ReprMixin
@@ -9,23 +11,29 @@ class Instruction(EqualityMixin, ReprMixin):
     """Instructions should be immutable."""
     
     def _compile_code(self, expression, instr_vars):
-        """Compile and save the given Python code."""
+        """Save the given Python code after checking its syntax; it is
+        compiled into a function when it is first executed."""
         self.expression = sub(r'\$(\d+)', r'group(\1).root.value', expression)
-        self.code = compile(self.expression, '<string>', 'eval')
+        _check_syntax(self.expression)
         self.instr_vars = instr_vars
     
-    def _evaluate_code(self, machine_vars, match, node=None):
-        """Evaluate the saved code in an environment containing auxiliary
-        functions, variables from the VM and the instruction object, matched
-        groups and (optionally) the given node."""
-        variables = {'text': (lambda obj: {'xmltext': str(obj)}),
-                     'num': (lambda xml_obj: int(xml_obj['xmltext']))}
-        variables.update(machine_vars)
-        variables.update(self.instr_vars)
-        variables['group'] = match.group
-        if node:
-            variables.update({'node': node, '_': node.value})
-        return eval(self.code, variables)
+    def _function(self, vm, parameters):
+        """Return the saved code compiled into a function of the given
+        parameters.
+        
+        Its globals -- auxiliary functions, variables from the VM and from
+        the instruction object -- are bound once per VM, so calling it is
+        the only cost per node.
+        """
+        entry = vm.functions.get(id(self))
+        if entry is None:
+            variables = dict(_HELPERS)
+            variables.update(vm.machine_vars)
+            variables.update(self.instr_vars)
+            code = _compile_function(self.expression, parameters)
+            # the instruction is kept, so its id cannot be reused
+            entry = vm.functions[id(self)] = (self, eval(code, variables))
+        return entry[1]
 
 
 class Find(Instruction):
@@ -33,25 +41,102 @@ class Find(Instruction):
     relationship with the context node and match the predicate."""
     
     def __init__(self, expression, **instr_vars):
-        """Save the expression in a textual and compiled version."""
+        """Save the expression and recognize trivial predicates which can be
+        tested without compiling it."""
         self._compile_code(expression, instr_vars)
+        self.kind, self.operand = self._specialize()
     
     def execute(self, branch):
-        """Find the nodes and return a list of branches which should replace
-        the supplied branch."""
-        new_branches = []
+        """Find the nodes and return a generator of branches which should
+        replace the supplied branch."""
         for node in self._matching_nodes(branch):
             new_branch = branch.copy()
-            for group in new_branch.groups:
-                new_branch.match.group(group).add_node(node)
-            new_branch.node = node
-            new_branches.append(new_branch)
-        return new_branches
+            new_branch.add_node(node)
+            yield new_branch
     
     def _matching_nodes(self, branch):
-        for node in branch.relation().search(branch.node):
-            if self._evaluate_code(branch.vm.machine_vars, branch.match, node):
-                yield node
+        nodes, predicate = self.candidates(branch)
+        return nodes if predicate is None else filter(predicate, nodes)
+    
+    def candidates(self, branch):
+        """Return the nodes in the relation with the context node (or found
+        by an index) and a function testing them, which is None if all
+        of them match."""
+        machine_vars = branch.vm.machine_vars
+        relation = branch.relation()
+        if self.kind == 'text' and 'str' not in machine_vars:
+            index = ValueIndex.of(branch.node)
+            if index is not None and hasattr(relation, 'indexed'):
+                nodes = relation.indexed(branch.node, index, self.operand)
+                if nodes is not None:
+                    return nodes, None
+        
+        nodes = relation.search(branch.node)
+        test = self.value_test(machine_vars)
+        if test is None and self.kind != 'any':
+            function, group = self._function(branch.vm, 'node, _, group'), \
+                branch.group
+            return nodes, lambda node: function(node, node.value, group)
+        return nodes, test
+    
+    def value_test(self, variables):
+        """Return a function testing a node by the constant predicate, or
+        None if the predicate is always true or it is not constant."""
+        operand = self.operand
+        if self.kind == 'text' and 'str' not in variables:
+            return lambda node: str(node.value) == operand
+        elif self.kind == 'equal':
+            return lambda node: node.value == operand
+        elif self.kind == 'member':
+            return lambda node: node.value in operand
+        else:
+            return None
+    
+    def _specialize(self):
+        """Return a (kind, operand) pair describing the predicate.
+        
+        The kind is 'any' for 'True', 'text' for "str(_) == str('x')",
+        'equal' for '_ == literal' and 'member' for '_ in (literals)'.
+        All other predicates have the kind None and are evaluated by
+        a function compiled from the expression.
+        """
+        import ast
+        body = ast.parse(self.expression, mode='eval').body
+        if isinstance(body, ast.Constant) and body.value is True:
+            return ('any', None)
+        if not (isinstance(body, ast.Compare) and len(body.ops) == 1):
+            return (None, None)
+        left, op, right = body.left, body.ops[0], body.comparators[0]
+        
+        if (isinstance(op, ast.Eq) and self._is_str_call(left, ast.Name)
+                and left.args[0].id == '_'
+                and self._is_str_call(right, ast.Constant)
+                and isinstance(right.args[0].value, str)
+                and 'str' not in self.instr_vars):
+            return ('text', right.args[0].value)
+        if not (isinstance(left, ast.Name) and left.id == '_'):
+            return (None, None)
+        if isinstance(right, ast.Name) and right.id in self.instr_vars:
+            operand = self.instr_vars[right.id]
+        else:
+            try:
+                operand = ast.literal_eval(right)
+            except (ValueError, TypeError):
+                return (None, None)
+        
+        if isinstance(op, ast.Eq):
+            return ('equal', operand)
+        elif isinstance(op, ast.In):
+            return ('member', operand)
+        else:
+            return (None, None)
+    
+    @staticmethod
+    def _is_str_call(node, arg_type):
+        import ast
+        return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id == 'str' and len(node.args) == 1
+                and not node.keywords and isinstance(node.args[0], arg_type))
     
     def __str__(self):
         """Return the string representation of the instruction."""
@@ -83,9 +168,9 @@ class GroupStart(Instruction):
         self.number = number
     
     def execute(self, branch):
-        """Add the corresponding group number and subtrees to the machine."""
-        branch.groups.add(self.number)
-        branch.match.groups().append(treepace.trees.Subtree())
+        """Add the corresponding group number and subtree to the branch."""
+        branch.groups = branch.groups | {self.number}
+        branch.group_count += 1
     
     def __str__(self):
         """Return the string representation of the instruction."""
@@ -101,7 +186,7 @@ class GroupEnd(Instruction):
     
     def execute(self, branch):
         """Remove the group number from the set of current group numbers."""
-        branch.groups.remove(self.number)
+        branch.groups = branch.groups - {self.number}
     
     def __str__(self):
         """Return the string representation of the instruction."""
@@ -118,13 +203,13 @@ class SearchReference(Instruction):
     def execute(self, branch):
         """Prepend instructions which will search for a subtree same as
         the given group's subtree."""
-        generated = branch.match.group(self.number).to_tree().traverse(
+        generated = branch.group(self.number).to_tree().traverse(
             node  = lambda node: [Find('_ == ref', ref=node.value)],
             down  = lambda: [SetRelation(Child)],
             right = lambda: [SetRelation(NextSibling)],
             up    = lambda: [SetRelation(Parent), Find('True')]
         )
-        branch.instructions[:0] = generated
+        branch.prepend(generated, self)
     
     def __str__(self):
         """Return the string representation of the instruction."""
@@ -136,14 +221,14 @@ class AddNode(Instruction):
     being built."""
     
     def __init__(self, expression, **instr_vars):
-        """Save the expression in a textual and compiled version."""
+        """Save the expression after checking its syntax."""
         self._compile_code(expression, instr_vars)
     
     def execute(self, vm):
         """Create a new node, add it to the tree (or create a tree if it
         does not yet exist) and set it as the context node."""
-        value = self._evaluate_code(vm.machine_vars, vm.match)
-        node = vm.match.group().root.__class__(value)
+        value = self._function(vm, 'group')(vm.match.group)
+        node = vm.match.group().root.copy_class(value)
         if not vm.tree:
             vm.tree = treepace.trees.Tree(node)
         else:
@@ -191,3 +276,22 @@ class GoToParent(Instruction):
     def __str__(self):
         """Return the string representation of the instruction."""
         return "GPAR"
+
+
+# auxiliary functions available in all expressions
+_HELPERS = {'text': (lambda obj: {'xmltext': str(obj)}),
+            'num': (lambda xml_obj: int(xml_obj['xmltext']))}
+
+@lru_cache(maxsize=4096)
+def _check_syntax(expression):
+    """Raise SyntaxError if the expression is invalid; equal expressions
+    are checked once."""
+    compile(expression, '<string>', 'eval')
+
+
+@lru_cache(maxsize=4096)
+def _compile_function(expression, parameters):
+    """Compile a lambda expression with the given parameters returning
+    the value of the expression (which can end with a comment)."""
+    return compile('lambda %s: (\n%s\n)' % (parameters, expression),
+                   '<string>', 'eval')
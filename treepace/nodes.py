@@ -18,7 +18,15 @@ class Node(ReprMixin, IPythonDotMixin):
         """
         self._value = value
         self._parent = None
-        self._children = []
+        self._first_child = None
+        self._last_child = None
+        self._previous_sibling = None
+        self._next_sibling = None
+        self._child_count = 0
+        self._child_tuple = ()
+        self._position = 0
+        self._positions_valid = True
+        self._indexes = ()
         for child in children:
             self.add_child(child)
     
@@ -31,6 +39,8 @@ class Node(ReprMixin, IPythonDotMixin):
     def value(self, _value):
         """Set the value of this node -- a string, a map or any other object."""
         self._value = _value
+        for index in self._indexes:
+            index.update(self)
     
     @property
     def parent(self):
@@ -39,28 +49,78 @@ class Node(ReprMixin, IPythonDotMixin):
     
     @property
     def children(self):
-        """Return a shallow-copied tuple containing the child nodes."""
-        return tuple(self._children)
+        """Return a tuple containing the child nodes.
+        
+        The tuple is cached until the child list changes, so repeated calls
+        do not copy anything.
+        """
+        if self._child_tuple is None:
+            self._child_tuple = tuple(self._iter_children())
+        return self._child_tuple
+    
+    @property
+    def next_sibling(self):
+        """Return the immediately following sibling or None."""
+        return self._next_sibling
+    
+    @property
+    def previous_sibling(self):
+        """Return the immediately preceding sibling or None."""
+        return self._previous_sibling
     
     def add_child(self, child):
         """Add a child node to the end."""
-        self.insert_child(child, len(self._children))
+        self.insert_child(child, self._child_count)
     
     def insert_child(self, child, index):
-        """Insert a child node at the specified index."""
+        """Insert a child node at the specified index.
+        
+        A node which is in another tree (or another place of this tree) is
+        moved; the indexes of its original tree are notified first.
+        """
+        for tree_index in child._indexes:
+            tree_index.remove(child)
+        if child._parent is not None:
+            child._parent._unlink(child)
         child._parent = self
-        self._children.insert(index, child)
+        if index >= self._child_count:
+            self._link(child, None)
+            child._position = self._child_count - 1
+        else:
+            self._link(child, self._child_at(max(index, 0)))
+            self._positions_valid = False
+        if self._indexes or child._indexes:
+            child._set_indexes(self._indexes)
+            for tree_index in self._indexes:
+                tree_index.insert(child)
     
     def detach(self):
         """Delete the node (it must not be a root)."""
-        del self.parent._children[self.index]
+        self.parent._unlink(self)
         self._parent = None
+        if self._indexes:
+            for tree_index in self._indexes:
+                tree_index.remove(self)
+            self._set_indexes(())
     
     @property
     def index(self):
-        """Return a zero-based order of this node among its siblings."""
-        siblings = self.parent.children if self.parent else [self]
-        return next(i for i, sibling in enumerate(siblings) if sibling == self)
+        """Return a zero-based order of this node among its siblings.
+        
+        The positions are cached. Appending a child or removing the last one
+        keeps them valid; any other change of the child list makes the next
+        read renumber all siblings. Reads between such changes take constant
+        time, but alternating them with changes in the middle of the list
+        takes linear time per read.
+        """
+        parent = self._parent
+        if parent is None:
+            return 0
+        if not parent._positions_valid:
+            for position, child in enumerate(parent._iter_children()):
+                child._position = position
+            parent._positions_valid = True
+        return self._position
     
     @property
     def level(self):
@@ -69,21 +129,81 @@ class Node(ReprMixin, IPythonDotMixin):
     
     @property
     def is_leaf(self):
-        return not self._children
+        return self._first_child is None
+    
+    @property
+    def copy_class(self):
+        """Return the class of nodes created as copies of this node."""
+        return self.__class__
     
     def path(self):
         """Return a list of nodes from the root to this node."""
         result = []
         node = self
         while node:
-            result.insert(0, str(node.value))
+            result.append(str(node.value))
             node = node.parent
+        result.reverse()
         return result
     
     def str_path(self):
         """Return a slash-separated path from the root node to this node."""
         return "/".join(self.path())
     
+    def _iter_children(self):
+        child = self._first_child
+        while child is not None:
+            yield child
+            child = child._next_sibling
+    
+    def _child_at(self, index):
+        if self._child_tuple is not None:
+            return self._child_tuple[index]
+        child = self._first_child
+        for _ in range(index):
+            child = child._next_sibling
+        return child
+    
+    def _link(self, child, following):
+        if following is not None:
+            preceding = following._previous_sibling
+        else:
+            preceding = self._last_child
+        child._previous_sibling = preceding
+        child._next_sibling = following
+        if preceding is not None:
+            preceding._next_sibling = child
+        else:
+            self._first_child = child
+        if following is not None:
+            following._previous_sibling = child
+        else:
+            self._last_child = child
+        self._child_count += 1
+        self._child_tuple = None
+    
+    def _unlink(self, child):
+        preceding, following = child._previous_sibling, child._next_sibling
+        if preceding is not None:
+            preceding._next_sibling = following
+        else:
+            self._first_child = following
+        if following is not None:
+            following._previous_sibling = preceding
+            self._positions_valid = False
+        else:
+            self._last_child = preceding
+        child._previous_sibling = child._next_sibling = None
+        self._child_count -= 1
+        self._child_tuple = None
+    
+    def _set_indexes(self, indexes):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._indexes = indexes
+            stack.extend(node._iter_children())
+    
     def replace_by(self, node):
         """Replace the node by an another node (including children)."""
         self.value = node.value
@@ -0,0 +1,127 @@
+"""A search distributed over a pool of processes which share a read-only
+snapshot of the tree."""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+import os
+import pickle
+from treepace.compiler import Compiler
+from treepace.frozen import FrozenNode, FrozenTree
+from treepace.instructions import Find
+from treepace.relations import Identic
+from treepace.search import Match, SearchMachine
+from treepace.trees import Subtree
+
+# the number of node ranges per process, so the work is balanced even if
+# the matches are distributed unevenly
+CHUNKS_PER_PROCESS = 8
+
+_ITEM_SIZE = array('i').itemsize
+
+class SharedTree:
+    """A snapshot of a tree in shared memory, searched by a process pool.
+    
+    The structure arrays of a frozen copy and the pickled node values are
+    stored in one shared memory block, which the worker processes map when
+    they start, so the tree is never sent to them. Each worker searches
+    a range of pre-order node numbers and returns only the numbers of the
+    matched nodes; they are converted to matches over the original nodes.
+    
+    The snapshot is not updated when the tree changes. The node values and
+    search variables must be picklable and predicates using the node object
+    receive read-only FrozenNode proxies.
+    """
+    
+    def __init__(self, tree, processes=None):
+        """Copy the tree to shared memory and start the processes (by default,
+        one per CPU)."""
+        frozen = FrozenTree.from_tree(tree)
+        self._nodes = list(tree.preorder())
+        self._processes = processes or os.cpu_count() or 1
+        
+        values = pickle.dumps(frozen._values, pickle.HIGHEST_PROTOCOL)
+        columns = [frozen._parents, frozen._first_children,
+                   frozen._next_siblings]
+        size = _ITEM_SIZE * len(self._nodes) * len(columns) + len(values)
+        self._memory = shared_memory.SharedMemory(create=True, size=size)
+        offset = 0
+        for column in columns + [values]:
+            data = memoryview(column).cast('B')
+            self._memory.buf[offset:offset + len(data)] = data
+            offset += len(data)
+        
+        self._executor = ProcessPoolExecutor(self._processes,
+            initializer=_attach,
+            initargs=(self._memory.name, len(self._nodes), len(values)))
+    
+    def search(self, pattern, **variables):
+        """Search for the pattern anywhere in the tree and return a list
+        of matches in document order (the same as by Tree.search)."""
+        Compiler.compile_pattern(pattern)
+        count = len(self._nodes)
+        step = max(1, -(-count // (self._processes * CHUNKS_PER_PROCESS)))
+        starts = range(0, count, step)
+        stops = [min(start + step, count) for start in starts]
+        results = self._executor.map(partial(_search_range, pattern,
+                                             variables), starts, stops)
+        
+        matches = []
+        for result in results:
+            for groups in result:
+                subtrees = [Subtree(self._nodes[number] for number in group)
+                            for group in groups]
+                matches.append(Match(subtrees))
+        return matches
+    
+    def close(self):
+        """Stop the processes and free the shared memory."""
+        self._executor.shutdown()
+        self._memory.close()
+        self._memory.unlink()
+    
+    def __enter__(self):
+        """Return the shared tree itself."""
+        return self
+    
+    def __exit__(self, *exc_info):
+        """Close the shared tree."""
+        self.close()
+
+
+# the shared memory block and the snapshot mapped by the current worker
+_memory = _tree = None
+
+def _attach(name, count, values_size):
+    """Map the shared memory block and wrap it in a frozen tree."""
+    global _memory, _tree
+    _memory = shared_memory.SharedMemory(name)
+    size = _ITEM_SIZE * count
+    columns = [_memory.buf[i * size:(i + 1) * size].cast('i')
+               for i in range(3)]
+    values = pickle.loads(_memory.buf[3 * size:3 * size + values_size])
+    _tree = FrozenTree(*columns, values=values)
+
+
+def _search_range(pattern, variables, start, stop):
+    """Search from each node in the range and return a list of matches,
+    each one a list of groups containing node numbers in pre-order."""
+    instructions = Compiler.compile_pattern(pattern)
+    result = []
+    for candidate in _candidates(instructions, variables, start, stop):
+        machine = SearchMachine(candidate, instructions, variables,
+                                relation=Identic)
+        for match in machine.finditer():
+            result.append([sorted(node._number for node in group.nodes)
+                           for group in match.groups()])
+    return result
+
+
+def _candidates(instructions, variables, start, stop):
+    """Return the nodes in the range which can match the first predicate,
+    testing them directly if it is a constant one."""
+    first = next(i for i in instructions if isinstance(i, Find))
+    nodes = (FrozenNode(_tree, number) for number in range(start, stop))
+    test = first.value_test(variables)
+    return nodes if test is None else filter(test, nodes)
@@ -0,0 +1,357 @@
+"""A tokenizer and recursive-descent parser for transformation rule strings
+and instruction generators driven by it.
+
+The language (spaces and tabs are allowed between all tokens except '$'
+and the number):
+
+    rule        = pattern '->' replacement
+    pattern     = group (relation group / '>')*
+    group       = node / '{' pattern '}'
+    node        = '.' / constant / '[' python_code ']' / '$' number
+    constant    = word characters / '"' characters except quotes '"'
+    relation    = '<' / '&' / ',' / '<<' / '^' / '~' / ';'
+    replacement = repl_node (('<' / ',') node / '>')*
+    repl_node   = constant / '[' python_code ']' / '$' number
+
+The relations are: a child, any sibling, the next sibling, a descendant
+(at any depth), an ancestor, any following sibling and any preceding
+sibling. Python code can contain nested brackets. Nothing in the text can
+span multiple lines.
+"""
+
+import re
+from treepace.compiler import CompileError
+from treepace.instructions import (AddNode, AddReference, Find, GoToParent,
+    GroupEnd, GroupStart, SearchReference, SetRelation)
+from treepace.relations import (Ancestor, Child, FollowingSibling,
+    NextSibling, Parent, PrecedingSibling, ProperDescendant, Sibling)
+
+# one token preceded by optional spaces or tabs; a bracket starts Python code
+# which is scanned separately
+_TOKEN = re.compile(r'''[ \t]*(?: (\w+) | "([^"\n]+)" | \$(\d+)
+                               | (->|<<|[.{}<&,>\[^~;]) | \Z)''', re.VERBOSE)
+
+_RELATIONS = {'<': 'child', '&': 'sibling', ',': 'next_sibling',
+              '<<': 'descendant', '^': 'ancestor', '~': 'following_sibling',
+              ';': 'preceding_sibling'}
+
+_DESCRIPTIONS = {'constant': "a constant", 'code': "Python code",
+                 'reference': "a reference", 'end': "the end of the text"}
+
+def parse_pattern(pattern):
+    """Parse the pattern and return an instruction list."""
+    parser = Parser(pattern)
+    generator = SearchGenerator()
+    parser.pattern(generator)
+    parser.finish()
+    return generator.instructions
+
+
+def parse_replacement(replacement):
+    """Parse the replacement and return an instruction list."""
+    parser = Parser(replacement)
+    generator = BuildGenerator()
+    parser.replacement(generator)
+    parser.finish()
+    return generator.instructions
+
+
+def parse_rule(rule):
+    """Parse the rule and return a pair of instruction lists -- searching
+    instructions and replacing instructions."""
+    parser = Parser(rule)
+    search_generator, build_generator = SearchGenerator(), BuildGenerator()
+    parser.pattern(search_generator)
+    parser.expect('->', "'->'")
+    parser.replacement(build_generator)
+    parser.finish()
+    return (search_generator.instructions, build_generator.instructions)
+
+
+class Parser:
+    """A recursive-descent parser calling a generator method for each
+    recognized element.
+    
+    Errors raised by the generator are postponed until the whole text is
+    parsed, so syntax errors take precedence over them.
+    """
+    
+    def __init__(self, text):
+        """Read the first token of the text."""
+        self._text = text
+        self._end = 0
+        self._error = None
+        self._advance()
+    
+    def pattern(self, generator):
+        """Parse a pattern (which can be nested in a group)."""
+        self._group(generator)
+        while True:
+            kind = self._kind
+            if kind in _RELATIONS:
+                self._advance()
+                self._generate(generator, _RELATIONS[kind])
+                self._group(generator)
+            elif kind == '>':
+                self._advance()
+                self._generate(generator, 'parent_any')
+            else:
+                return
+    
+    def replacement(self, generator):
+        """Parse a replacement."""
+        if self._kind == '.':
+            self._fail("a constant, Python code or a reference")
+        self._node(generator)
+        while True:
+            kind = self._kind
+            if kind in ('<', ','):
+                self._advance()
+                self._generate(generator, _RELATIONS[kind])
+                self._node(generator)
+            elif kind == '>':
+                self._advance()
+                self._generate(generator, 'parent_any')
+            else:
+                return
+    
+    def expect(self, kind, description):
+        """Skip a token of the given kind or raise ParseError."""
+        if self._kind != kind:
+            self._fail(description)
+        self._advance()
+    
+    def finish(self):
+        """Check that the whole text was parsed and raise the first error
+        from the generators, if any."""
+        if self._kind != 'end':
+            self._fail("the end of the text")
+        if self._error is not None:
+            raise self._error
+    
+    def _group(self, generator):
+        if self._kind == '{':
+            self._advance()
+            self._generate(generator, 'group_start')
+            self.pattern(generator)
+            self.expect('}', "'}'")
+            self._generate(generator, 'group_end')
+        else:
+            self._node(generator)
+    
+    def _node(self, generator):
+        kind, value = self._kind, self._value
+        if kind == '.':
+            self._advance()
+            self._generate(generator, 'any')
+        elif kind in ('constant', 'code', 'reference'):
+            self._advance()
+            self._generate(generator, kind, value)
+        else:
+            self._fail("a node")
+    
+    def _generate(self, generator, method, *args):
+        try:
+            getattr(generator, method)(*args)
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+    
+    def _advance(self):
+        """Read the next token: set its kind, value and starting position."""
+        match = _TOKEN.match(self._text, self._end)
+        if match is None:
+            self._position = len(self._text) - len(
+                self._text[self._end:].lstrip(' \t'))
+            self._kind = self._value = None
+            self._fail("a token")
+        
+        self._position = match.end(0) - len(match.group(0).lstrip(' \t'))
+        self._end = match.end(0)
+        word, quoted, number, symbol = match.groups()
+        if word is not None or quoted is not None:
+            self._kind = 'constant'
+            self._value = word if word is not None else quoted
+        elif number is not None:
+            self._kind, self._value = 'reference', int(number)
+        elif symbol == '[':
+            self._kind, self._value = 'code', self._scan_code()
+        elif symbol is not None:
+            self._kind, self._value = symbol, None
+        else:
+            self._kind, self._value = 'end', None
+    
+    def _scan_code(self):
+        """Return the Python code after an opening bracket and move the end
+        after the closing one."""
+        start = position = self._end
+        while True:
+            end = self._code_part(position)
+            if end is None:
+                break
+            position = end
+        if position == start or self._text[position:position + 1] != ']':
+            self._position = position
+            self._kind = self._value = None
+            self._fail("Python code and ']'" if position == start else "']'")
+        self._end = position + 1
+        return self._text[start:position]
+    
+    def _code_part(self, position):
+        """Return the end of a part of Python code -- a run of characters
+        except brackets or one bracketed part -- or None."""
+        end = position
+        while end < len(self._text) and self._text[end] not in '[]\n':
+            end += 1
+        if end > position:
+            return end
+        if self._text[position:position + 1] == '[':
+            end = self._code_part(position + 1)
+            if end is not None and self._text[end:end + 1] == ']':
+                return end + 1
+        return None
+    
+    def _fail(self, expected):
+        character = self._text[self._position:self._position + 1]
+        if self._kind is None and character:
+            found = repr(character)
+        elif self._kind is None:
+            found = _DESCRIPTIONS['end']
+        else:
+            found = _DESCRIPTIONS.get(self._kind, repr(self._kind))
+        raise ParseError("Expected %s, found %s" % (expected, found),
+                         self._text, self._position)
+
+
+class InstructionGenerator:
+    """A base class with common behavior for generators of virtual machine
+    instructions, whose methods are called by the parser."""
+    
+    def __init__(self):
+        """Initialize the instruction list and a level counter."""
+        self.instructions = []
+        self._child_level = 0
+    
+    def child(self):
+        """Add the instruction 'REL child'."""
+        self._add(SetRelation(Child))
+        self._child_level += 1
+    
+    def next_sibling(self):
+        """Add the instruction 'REL next_sib'."""
+        self._add(SetRelation(NextSibling))
+    
+    def _add(self, instruction):
+        self.instructions.append(instruction)
+    
+    def _check_child_level(self):
+        if self._child_level < 0:
+            raise CompileError('Too many parent relations')
+
+
+class SearchGenerator(InstructionGenerator):
+    """A generator of tree-searching instructions."""
+    
+    def __init__(self):
+        """Initialize the group counters."""
+        super().__init__()
+        self._started_group = 0
+        self._ended_groups = set()
+    
+    def any(self):
+        """Add an instruction which matches any node."""
+        self._add(Find('True'))
+    
+    def constant(self, text):
+        """Add an instruction which matches the constant."""
+        self._add(Find('str(_) == str(%s)' % repr(text)))
+    
+    def code(self, code):
+        """Add an instruction which matches the predicate."""
+        self._add(Find(code))
+    
+    def reference(self, group_num):
+        """Add a back-referencing instruction."""
+        if group_num not in self._ended_groups:
+            raise CompileError('Group %d cannot be referenced yet' % group_num)
+        self._add(SearchReference(group_num))
+    
+    def group_start(self):
+        """Add a group-starting instruction and adjust the counters."""
+        self._started_group += 1
+        self._add(GroupStart(self._started_group))
+    
+    def group_end(self):
+        """Add a group-ending instruction and adjust the counter."""
+        end = max(set(range(1, self._started_group + 1)) - self._ended_groups)
+        self._ended_groups.add(end)
+        self._add(GroupEnd(end))
+    
+    def sibling(self):
+        """Add the instruction 'REL sibling'."""
+        self._add(SetRelation(Sibling))
+    
+    def descendant(self):
+        """Add the instruction 'REL descendant'; the node is at least one
+        level lower, like a child."""
+        self._add(SetRelation(ProperDescendant))
+        self._child_level += 1
+    
+    def ancestor(self):
+        """Add the instruction 'REL ancestor'."""
+        self._add(SetRelation(Ancestor))
+    
+    def following_sibling(self):
+        """Add the instruction 'REL following_sib'."""
+        self._add(SetRelation(FollowingSibling))
+    
+    def preceding_sibling(self):
+        """Add the instruction 'REL preceding_sib'."""
+        self._add(SetRelation(PrecedingSibling))
+    
+    def parent_any(self):
+        """The 'parent' relation followed by an implicit 'any' pattern."""
+        self._add(SetRelation(Parent))
+        self._add(Find('True'))
+        self._child_level -= 1
+        self._check_child_level()
+
+
+class BuildGenerator(InstructionGenerator):
+    """A generator of instructions which build a replacement tree."""
+    
+    def any(self):
+        """A '.' following a relation in a replacement adds nothing."""
+        pass
+    
+    def constant(self, text):
+        """Add an instruction which appends a node with a constant value
+        to the tree."""
+        self._add(AddNode(repr(text)))
+    
+    def code(self, code):
+        """Add an instruction which appends a dynamically generated node
+        to the tree."""
+        self._add(AddNode(code))
+    
+    def reference(self, group_num):
+        """Add a back-referencing instruction."""
+        self._add(AddReference(group_num))
+    
+    def parent_any(self):
+        """Add an instruction which navigates up in the tree being built."""
+        self._add(GoToParent())
+        self._child_level -= 1
+        self._check_child_level()
+
+
+class ParseError(CompileError):
+    """Raised when the text does not conform to the syntax; the position
+    of the unexpected token is available in the 'position' attribute."""
+    
+    def __init__(self, message, text, position):
+        """Save the position and include it in the message."""
+        super().__init__("%s at position %d: %s" % (message, position,
+                                                    text))
+        self.text = text
+        self.position = position
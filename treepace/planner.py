@@ -0,0 +1,177 @@
+"""A query planner which starts a search from the most selective node
+of the pattern instead of trying every node as the pattern root."""
+
+from time import perf_counter
+from treepace.index import (ValueIndex, document_order, is_ancestor,
+                            subtree_nodes)
+from treepace.instructions import Find, SearchReference, SetRelation
+from treepace.relations import Descendant
+from treepace.search import SearchMachine
+from treepace.stats import SearchStats
+from treepace.utils import ReprMixin
+
+class Plan(ReprMixin):
+    """A chosen way of executing a search.
+    
+    Without an anchor, every node is tried as the pattern root (taken from
+    the list of roots if the planning has already listed all nodes).
+    Otherwise, the nodes matching the anchor (a constant predicate) are
+    found first and the pattern root candidates are reached from them
+    through the inverse relations. The pattern is then matched from the
+    candidates in document order by one machine, so the matches are
+    the same as without planning.
+    """
+    
+    def __init__(self, instructions, chain, estimates, anchor=None,
+                 roots=None, reason='', visited=0):
+        """Save the plan: the instructions, the (find, relation) chain,
+        the estimated node counts by chain position, the anchor position,
+        the candidate roots and the number of nodes visited by planning."""
+        self.instructions = instructions
+        self.chain = chain
+        self.estimates = estimates
+        self.anchor = anchor
+        self.roots = roots
+        self.reason = reason
+        self.visited = visited
+    
+    def finditer(self, root, variables):
+        """Return a generator of the matches."""
+        machine = SearchMachine(root, self.instructions, variables,
+                                starts=self.roots)
+        return machine.finditer()
+    
+    def __str__(self):
+        """Return a description of the plan with one line per node of
+        the pattern."""
+        if self.anchor is None:
+            lines = ["scan all nodes (%s)" % self.reason]
+        else:
+            path = [self.chain[position][1]().inverse().name
+                    for position in range(self.anchor, 0, -1)]
+            lines = ["anchor %d, reach the root by %s: %d candidate roots"
+                     % (self.anchor, ', '.join(path), len(self.roots))]
+        for position, (find, relation) in enumerate(self.chain):
+            estimate = self.estimates.get(position)
+            lines.append("%s%d: %s %s%s" % (
+                '*' if position == self.anchor else ' ', position,
+                relation.name if position else 'start', find,
+                '' if estimate is None else ' (%d nodes)' % estimate))
+        return '\n'.join(lines)
+
+
+def plan_search(root, instructions, variables):
+    """Return a plan of searching for the pattern anywhere in the tree with
+    the given root.
+    
+    The selectivity of the constant predicates is estimated by a value index
+    if the tree has one, otherwise by one pass over the tree, which is done
+    only if the predicate of the pattern root is not constant itself.
+    The most selective node is used as the anchor only if the estimated
+    number of nodes visited from it is smaller than the tree; otherwise,
+    the nodes listed by the pass (if any) are tried as the pattern root.
+    
+    If a SearchStats context is active, the planning is counted by it.
+    """
+    begin = perf_counter()
+    plan = _plan(root, instructions, variables)
+    stats = SearchStats.active()
+    if stats is not None:
+        stats.count_planning(plan.visited, perf_counter() - begin)
+    return plan
+
+
+def _plan(root, instructions, variables):
+    chain = pattern_chain(instructions)
+    positions = [position for position, (find, _) in enumerate(chain)
+                 if find.kind == 'text' and 'str' not in variables]
+    if not positions:
+        return Plan(instructions, chain, {}, reason="no constant predicates")
+    
+    index = ValueIndex.of(root)
+    if index is not None:
+        estimates = {position: index.count(chain[position][0].operand)
+                     for position in positions}
+        size, visited = len(index), 0
+    elif chain[0][0].kind in ('any', None):
+        found = {chain[position][0].operand: [] for position in positions}
+        scanned = []
+        for node in subtree_nodes(root):
+            scanned.append(node)
+            nodes = found.get(str(node.value))
+            if nodes is not None:
+                nodes.append(node)
+        estimates = {position: len(found[chain[position][0].operand])
+                     for position in positions}
+        size = visited = len(scanned)
+    else:
+        return Plan(instructions, chain, {},
+                    reason="the root predicate is selective")
+    
+    anchor = min(positions, key=lambda position: estimates[position])
+    if anchor == 0:
+        return Plan(instructions, chain, estimates, visited=visited,
+                    reason="the root is the most selective")
+    if estimates[anchor] * anchor >= size:
+        # the nodes listed by the counting pass are scanned, so the tree
+        # is not traversed again
+        return Plan(instructions, chain, estimates, visited=visited,
+                    roots=None if index else scanned,
+                    reason="the anchor is not more selective than a scan")
+    operand = chain[anchor][0].operand
+    nodes = index.find(operand, root) if index else found[operand]
+    for position in range(anchor, 0, -1):
+        previous = chain[position - 1][0]
+        test = _safe(previous.value_test(variables))
+        inverse = chain[position][1]().inverse()()
+        indexed = (index is not None and previous.kind == 'text'
+                   and hasattr(inverse, 'indexed'))
+        reached = {}
+        for node in nodes:
+            others = (inverse.indexed(node, index, previous.operand)
+                      if indexed else None)
+            if others is None:
+                others = inverse.search(node)
+            for other in others:
+                visited += 1
+                if test(other):
+                    reached[other] = None
+        nodes = reached
+    roots = document_order(node for node in nodes if is_ancestor(root, node))
+    return Plan(instructions, chain, estimates, anchor, roots,
+                visited=visited)
+
+
+def pattern_chain(instructions):
+    """Return a list of (find, relation) pairs for the Find instructions of
+    the pattern, where each node is searched in the relation with the node
+    found by the previous one.
+    
+    The chain ends before the first back-reference, because the nodes it
+    matches are not known in advance.
+    """
+    chain = []
+    relation = Descendant
+    for instruction in instructions:
+        if isinstance(instruction, SearchReference):
+            break
+        elif isinstance(instruction, SetRelation):
+            relation = instruction.relation
+        elif isinstance(instruction, Find):
+            chain.append((instruction, relation))
+    return chain
+
+
+def _safe(test):
+    """Return a function which returns False only for nodes which certainly
+    do not match the given value test of a Find (None accepts all nodes).
+    
+    If the test raises an exception, the node is kept, so the exception is
+    raised (or not) during the real search.
+    """
+    def safe_test(node):
+        try:
+            return test is None or test(node)
+        except Exception:
+            return True
+    return safe_test
@@ -0,0 +1,308 @@
+"""Transformation programs -- rule lists executed until no rule matches."""
+
+import re
+from treepace.build import BuildMachine
+from treepace.compiler import Compiler
+from treepace.index import document_order
+from treepace.instructions import Find, SearchReference, SetRelation
+from treepace.relations import (Ancestor, Child, FollowingSibling, Identic,
+    NextSibling, Parent, PrecedingSibling, ProperDescendant, Sibling)
+from treepace.search import Match, SearchBranch, SearchMachine
+
+class Program:
+    """A compiled transformation program.
+    
+    Each rule is searched only from candidate roots -- the nodes where a local
+    prefix of its pattern matches. All nodes are classified in one traversal
+    by a combined matcher of all rules. After each replacement, only the nodes
+    near the touched nodes are classified again, because the prefixes match
+    the other nodes in the same way as before.
+    """
+    
+    def __init__(self, text):
+        """Compile the rules -- one 'pattern -> replacement' per line."""
+        lines = (line for line in text.splitlines() if line.strip())
+        self.rules = [Compiler.compile_rule(line) for line in lines]
+        self.prefixes = [local_prefix(search) for search, _ in self.rules]
+        self.reaches = set(map(pattern_reach, self.prefixes))
+    
+    def execute(self, tree, variables):
+        """Execute each rule while its pattern matches and loop the whole rule
+        list until no rule matches."""
+        self._tree = tree
+        self._vm = SearchMachine(tree.root, [], variables)
+        self._matcher = CombinedMatcher(self.prefixes, 'str' not in variables)
+        self._roots = [{} if any(isinstance(i, Find) for i in prefix) else None
+                       for prefix in self.prefixes]
+        self._in_order = [True] * len(self.rules)
+        self._classify(tree.preorder())
+        
+        while True:
+            rule_matched = False
+            for number, (search, replace) in enumerate(self.rules):
+                matches = True
+                while matches:
+                    matches = self._search(number, variables)
+                    Match.check_disjoint(matches)
+                    touched = []
+                    for match in matches:
+                        new_tree = BuildMachine(match, replace,
+                                                variables).build()
+                        touched.extend(match.group().nodes)
+                        touched.extend(new_tree.preorder())
+                        match.group().replace_by(new_tree)
+                    if matches:
+                        rule_matched = True
+                        self._classify(self._affected_nodes(touched), False)
+            if not rule_matched:
+                break
+    
+    def _classify(self, nodes, in_order=True):
+        """Update the candidate roots of all rules by matching the prefixes
+        at the given nodes (which are new or changed unless they are
+        in pre-order)."""
+        partial = [number for number, roots in enumerate(self._roots)
+                   if roots and not in_order
+                   and len(self.prefixes[number]) < len(self.rules[number][0])]
+        for node in nodes:
+            numbers = self._matcher.match(node, self._vm)
+            for number in numbers:
+                if self._roots[number] is not None:
+                    self._roots[number][node] = None
+                    self._in_order[number] &= in_order
+            # the candidates of partially local rules are kept between
+            # searches, so they must be removed when they stop matching
+            for number in partial:
+                if number not in numbers:
+                    self._roots[number].pop(node, None)
+    
+    def _affected_nodes(self, touched):
+        """Return the nodes where the prefix matching could have changed
+        and forget the candidate roots which were removed from the tree."""
+        live = self._live_nodes(set(touched))
+        for roots in self._roots:
+            if roots:
+                for node, alive in live.items():
+                    if not alive:
+                        roots.pop(node, None)
+        
+        affected = set()
+        for low, high in self.reaches:
+            for node, alive in live.items():
+                if alive:
+                    affected.update(candidate_roots(node, low, high))
+        return affected
+    
+    def _live_nodes(self, touched):
+        """Return a dictionary telling which touched nodes are still
+        in the tree.
+        
+        Only the touched nodes are detached by the replacements, so a node
+        is in the tree if it is the root or the nearest untouched node
+        above it is reached; the walks through touched nodes are shared.
+        """
+        root = self._tree.root
+        live = {}
+        for node in touched:
+            path = []
+            current = node
+            while (current is not None and current in touched
+                   and current not in live and current is not root):
+                path.append(current)
+                current = current.parent
+            if current is None:
+                alive = False
+            else:
+                alive = live.get(current, True)
+            for path_node in path:
+                live[path_node] = alive
+            if current is root and root in touched:
+                live[root] = True
+        return live
+    
+    def _search(self, number, variables):
+        """Return all matches of the rule in the tree, searching only from
+        the candidate roots if possible."""
+        search = self.rules[number][0]
+        root = self._tree.root
+        if self._roots[number] is None:
+            return SearchMachine(root, search, variables).search()
+        
+        candidates = list(self._roots[number])
+        if not self._in_order[number]:
+            candidates = document_order(candidates)
+        # the whole pattern is local: the candidates which do not match now
+        # can match again only after being touched
+        if len(self.prefixes[number]) == len(search):
+            self._roots[number] = {}
+        else:
+            self._roots[number] = dict.fromkeys(candidates)
+        self._in_order[number] = True
+        
+        matches = []
+        for candidate in candidates:
+            machine = SearchMachine(candidate, search, variables,
+                                    relation=Identic)
+            matches.extend(machine.search())
+        return matches
+
+
+class CombinedMatcher:
+    """A prefix tree of instruction lists which finds all patterns matching
+    at a given node in one pass.
+    
+    Common instruction prefixes are executed only once and the constant
+    predicates following the same instruction are dispatched by a dictionary
+    lookup of the node value.
+    """
+    
+    def __init__(self, patterns, dispatch_text=True):
+        """Build the prefix tree of the instruction lists. Constant predicates
+        are not dispatched if the 'str' function is overridden."""
+        self._root = _PrefixNode(None)
+        for number, instructions in enumerate(patterns):
+            prefix_node = self._root
+            prefix_node.below.add(number)
+            for instruction in instructions:
+                prefix_node = prefix_node.child(instruction, dispatch_text)
+                prefix_node.below.add(number)
+            prefix_node.numbers.append(number)
+    
+    def match(self, node, vm):
+        """Return a set of numbers of the patterns which match at the node.
+        
+        If a predicate raises an exception, all patterns containing it are
+        considered to match, so the exception can be raised (or not) during
+        the real search.
+        """
+        result = set()
+        stack = [(self._root, SearchBranch(node, (), vm, Identic))]
+        while stack:
+            prefix_node, branch = stack.pop()
+            result.update(prefix_node.numbers)
+            if result and prefix_node.below <= result:
+                continue
+            for child in prefix_node.generic:
+                if isinstance(child.instruction, Find):
+                    try:
+                        stack.extend((child, new_branch) for new_branch
+                                     in child.instruction.execute(branch))
+                    except Exception:
+                        result.update(child.below)
+                else:
+                    new_branch = branch.copy()
+                    child.instruction.execute(new_branch)
+                    stack.append((child, new_branch))
+            if prefix_node.texts:
+                for found in branch.relation().search(branch.node):
+                    child = prefix_node.texts.get(str(found.value))
+                    if child is not None:
+                        new_branch = branch.copy()
+                        new_branch.add_node(found)
+                        stack.append((child, new_branch))
+        return result
+
+
+class _PrefixNode:
+    """A node of the prefix tree containing the instruction, numbers of
+    the patterns ending here and of all patterns in the subtree."""
+    
+    def __init__(self, instruction):
+        """Create a node without children."""
+        self.instruction = instruction
+        self.numbers = []
+        self.below = set()
+        self.generic = []
+        self.texts = {}
+        self._children = {}
+    
+    def child(self, instruction, dispatch_text):
+        """Return the child node for the instruction, creating it if needed."""
+        key = (type(instruction), str(instruction))
+        if key not in self._children:
+            child = _PrefixNode(instruction)
+            self._children[key] = child
+            if dispatch_text and getattr(instruction, 'kind', None) == 'text':
+                self.texts[instruction.operand] = child
+            else:
+                self.generic.append(child)
+        return self._children[key]
+
+
+def pattern_reach(instructions):
+    """Return a (low, high) pair of the minimum and maximum level, relative
+    to the match root, of the nodes whose values or child lists affect
+    the match.
+    
+    None is returned if the reach is not bounded -- when the pattern contains
+    back-references, predicates using the node object or whole groups,
+    or descendant or ancestor relations.
+    """
+    level = low = high = 0
+    relation = None
+    for instruction in instructions:
+        if isinstance(instruction, SearchReference):
+            return None
+        elif isinstance(instruction, SetRelation):
+            relation = instruction.relation
+            if relation in _UNBOUNDED:
+                return None
+        elif isinstance(instruction, Find):
+            if not _is_local(instruction):
+                return None
+            if relation is Child:
+                level += 1
+                high = max(high, level)
+            elif relation is Parent:
+                level -= 1
+                low = min(low, level)
+            elif relation in (NextSibling, Sibling, FollowingSibling,
+                              PrecedingSibling):
+                low = min(low, level - 1)
+    return (low, high)
+
+
+def candidate_roots(node, low, high):
+    """Return the nodes which can be roots of matches affected by a change
+    of the node (which must be in the tree)."""
+    ancestors = []
+    while node is not None and len(ancestors) <= high - low:
+        ancestors.append(node)
+        node = node.parent
+    
+    result = []
+    for ancestor in ancestors:
+        level = [ancestor]
+        for _ in range(-low):
+            level = [child for node in level for child in node.children]
+        result.extend(level)
+    return result
+
+
+def local_prefix(instructions):
+    """Return the longest prefix of the instructions which does not contain
+    back-references, predicates using the node object or whole groups
+    and relations with an unbounded reach."""
+    for position, instruction in enumerate(instructions):
+        if (isinstance(instruction, SearchReference)
+                or isinstance(instruction, Find) and not _is_local(instruction)
+                or isinstance(instruction, SetRelation)
+                and instruction.relation in _UNBOUNDED):
+            return instructions[:position]
+    return instructions
+
+
+# relations which can reach nodes at any distance in the tree
+_UNBOUNDED = (ProperDescendant, Ancestor)
+
+def _is_local(find):
+    """Return True if the predicate uses only the values of nodes."""
+    if find.kind is not None:
+        return True
+    if 'node' not in find.expression and 'group' not in find.expression:
+        return True
+    import ast
+    expression = re.sub(r'group\(\d+\)\.root\.value', '_', find.expression)
+    tree = ast.parse(expression, mode='eval')
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    return not names & {'node', 'group'}
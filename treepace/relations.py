@@ -1,6 +1,6 @@
 """Tree node relations."""
 
-import treepace.trees
+from treepace.index import StructureIndex, subtree_nodes
 
 class Child:
     """A child relation."""
@@ -14,6 +14,10 @@ class Child:
     def build(self, context, node):
         """Add the given node as a first child of the context node."""
         context.add_child(node)
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return Parent
 
 
 class Sibling:
@@ -27,6 +31,10 @@ class Sibling:
             return filter(lambda x: x != node, node.parent.children)
         else:
             return []
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return Sibling
 
 
 class NextSibling:
@@ -37,15 +45,36 @@ class NextSibling:
     def search(self, node):
         """Return a list with one element (the next sibling) or an empty
         list."""
-        next_index = node.index + 1
-        if node.parent and len(node.parent.children) > next_index:
-            return [node.parent.children[next_index]]
-        else:
-            return []
+        sibling = node.next_sibling
+        return [sibling] if sibling is not None else []
     
     def build(self, context, node):
-        """Insert the given node just after the context node."""
-        context.parent.insert_child(node, context.index + 1)
+        """Insert the given node just after the context node (appending it
+        if possible, which keeps the sibling positions valid)."""
+        if context.next_sibling is None:
+            context.parent.add_child(node)
+        else:
+            context.parent.insert_child(node, context.index + 1)
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return PreviousSibling
+
+
+class PreviousSibling:
+    """An immediately preceding sibling."""
+    
+    name = "prev_sib"
+    
+    def search(self, node):
+        """Return a list with one element (the previous sibling) or an empty
+        list."""
+        sibling = node.previous_sibling
+        return [sibling] if sibling is not None else []
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return NextSibling
 
 
 class Parent:
@@ -56,6 +85,10 @@ class Parent:
     def search(self, node):
         """Return a one-element list with the node's parent or an empty list."""
         return [node.parent] if node.parent else []
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return Child
 
 
 class Descendant:
@@ -67,7 +100,93 @@ class Descendant:
     def search(self, node):
         """Return an iterable with all node's descendants in a pre-order
         manner."""
-        return treepace.trees.Tree(node).preorder()
+        return subtree_nodes(node)
+    
+    def indexed(self, node, index, value):
+        """Return a list of the nodes found by search() whose values are
+        equal to the given one (using string comparison), looked up
+        in a value index."""
+        return index.find(value, node)
+
+
+class ProperDescendant:
+    """A descendant (excluding the node itself)."""
+    
+    name = "descendant"
+    
+    def search(self, node):
+        """Return a generator of the node's descendants in pre-order."""
+        nodes = subtree_nodes(node)
+        next(nodes)
+        return nodes
+    
+    def indexed(self, node, index, value):
+        """Return a list of the nodes found by search() whose values are
+        equal to the given one (using string comparison), looked up
+        in a value index, or None if the subtree is not numbered by
+        a structure index, so scanning it is cheaper."""
+        if node.parent is not None and StructureIndex.of(node) is None:
+            return None
+        nodes = index.find(value, node)
+        return nodes[1:] if nodes and nodes[0] == node else nodes
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return Ancestor
+
+
+class Ancestor:
+    """An ancestor -- the parent, its parent and so on up to the root."""
+    
+    name = "ancestor"
+    
+    def search(self, node):
+        """Return a generator of the node's ancestors, starting with
+        the parent."""
+        node = node.parent
+        while node is not None:
+            yield node
+            node = node.parent
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return ProperDescendant
+
+
+class FollowingSibling:
+    """Any sibling after the node."""
+    
+    name = "following_sib"
+    
+    def search(self, node):
+        """Return a generator of the following siblings in document
+        order."""
+        node = node.next_sibling
+        while node is not None:
+            yield node
+            node = node.next_sibling
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return PrecedingSibling
+
+
+class PrecedingSibling:
+    """Any sibling before the node."""
+    
+    name = "preceding_sib"
+    
+    def search(self, node):
+        """Return a generator of the preceding siblings, starting with
+        the nearest one."""
+        node = node.previous_sibling
+        while node is not None:
+            yield node
+            node = node.previous_sibling
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return FollowingSibling
 
 
 class Identic:
@@ -78,3 +197,7 @@ class Identic:
     def search(self, node):
         """Return a list with the given node."""
         return [node]
+    
+    def inverse(self):
+        """Return the relation of the found nodes to the original one."""
+        return Identic
@@ -1,19 +1,17 @@
 """Tree replacing strategies."""
 
-from itertools import chain, zip_longest
-
 class ReplaceStrategy:
     """A tree replacing strategy is an algorithm for replacement of a subtree
     with an another tree which is applicable only if some condition is met."""
     
-    def __init__(self, old, new):
-        """Set an old subtree and a new tree."""
+    def __init__(self, old, new, shapes=None):
+        """Set an old subtree, a new tree and a pair of their shapes, which
+        are computed if they are not given."""
         self._old = old
         self._new = new
-    
-    def _inner_nonsubtree_child(self):
-        inner_children = chain(*(inner.children for inner in self._old.inner))
-        return any(child not in self._old.nodes for child in inner_children)
+        if shapes is None:
+            shapes = (Shape(old.root, old.nodes), Shape(new.root))
+        self._old_shape, self._new_shape = shapes
     
     @staticmethod
     def all_strategies():
@@ -22,20 +20,48 @@ class ReplaceStrategy:
                 SameConnectedCount]
 
 
+class Shape:
+    """The structure of a tree or a subtree collected in one pre-order pass,
+    so the strategies tested for one replacement do not traverse it again."""
+    
+    def __init__(self, root, members=None):
+        """Traverse the nodes from the root. If a set of member nodes is
+        given, the other children are outside of the subtree."""
+        self.nodes = []
+        self.signature = []
+        self.leaves = []
+        self.connected_leaves = []
+        self.inner_outside_children = False
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.nodes.append(node)
+            children = node.children
+            if members is None:
+                inside = children
+            else:
+                inside = [child for child in children if child in members]
+            self.signature.append(len(inside))
+            if not inside:
+                self.leaves.append(node)
+                if children:
+                    self.connected_leaves.append(node)
+            elif len(inside) < len(children):
+                self.inner_outside_children = True
+            stack.extend(reversed(inside))
+
+
 class SameShape(ReplaceStrategy):
     """Replacement of a subtree by a tree with the same shape."""
     
     def test(self):
-        """Traverse and compare the trees, ignoring the values."""
-        generate = {'node': lambda node: ['n'], 'down': lambda: ['d'],
-            'right': lambda: ['r'], 'up': lambda: ['u']}
-        subtree = self._old.to_tree().traverse(**generate)
-        replacement = self._new.traverse(**generate)
-        return all(x == y for x, y in zip_longest(subtree, replacement))
+        """Compare the child counts of the nodes in pre-order, ignoring
+        the values."""
+        return self._old_shape.signature == self._new_shape.signature
     
     def apply(self):
         """Set the subtree node values to the values of the tree."""
-        for old, new in zip(self._old.preorder(), self._new.preorder()):
+        for old, new in zip(self._old_shape.nodes, self._new_shape.nodes):
             old.value = new.value
 
 
@@ -49,15 +75,26 @@ class ToOneNode(ReplaceStrategy):
     def apply(self):
         """The replacement node child list will consist of all children
         of the original subtree leaves."""
-        while len(self._old.nodes) > 1:
-            for leaf in list(self._old.leaves):
-                self._old.remove_node(leaf)
-                parent, index = leaf.parent, leaf.index
-                leaf.detach()
-                for child in reversed(leaf.children):
-                    parent.insert_child(child, index)
+        root, members = self._old.root, self._old.nodes
+        outside = []
+        stack = [iter(root.children)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+            elif child in members:
+                stack.append(iter(child.children))
+            else:
+                outside.append(child)
         
-        self._old.root.value = self._new.root.value
+        for child in outside:
+            root.add_child(child)
+        for child in root.children:
+            if child in members:
+                child.detach()
+        for node in reversed(self._old_shape.nodes[1:]):
+            self._old.remove_node(node)
+        root.value = self._new.root.value
 
 
 class NoConnectedLeaves(ReplaceStrategy):
@@ -67,8 +104,8 @@ class NoConnectedLeaves(ReplaceStrategy):
     def test(self):
         """"The subtree must not have 'connected leaves' and its inner nodes
         must not have children outside the subtree."""
-        no_connected = not self._old.connected_leaves
-        return no_connected and not self._inner_nonsubtree_child()
+        return not (self._old_shape.connected_leaves
+                    or self._old_shape.inner_outside_children)
     
     def apply(self):
         """The subtree root node is replaced by the new tree root node."""
@@ -83,13 +120,13 @@ class LeafCountStrategy(ReplaceStrategy):
     def test(self):
         """In addition, non-leaf subtree nodes must not have children outside
         of the subtree."""
-        same_leaf_count = len(self._leaves()) == len(self._new.leaves)
-        return same_leaf_count and not self._inner_nonsubtree_child()
+        same_leaf_count = len(self._leaves()) == len(self._new_shape.leaves)
+        return same_leaf_count and not self._old_shape.inner_outside_children
     
     def apply(self):
         """Children of the subtree leaves become the children of the tree
         leaves, then the roots are replaced."""
-        for old_leaf, new_leaf in zip(self._leaves(), self._new.leaves):
+        for old_leaf, new_leaf in zip(self._leaves(), self._new_shape.leaves):
             for child in old_leaf.children:
                 child.detach()
                 new_leaf.add_child(child)
@@ -100,7 +137,7 @@ class SameLeafCount(LeafCountStrategy):
     """Replacement of a subtree by a tree with the same leaf count."""
     
     def _leaves(self):
-        return self._old.leaves
+        return self._old_shape.leaves
 
 
 class SameConnectedCount(LeafCountStrategy):
@@ -108,7 +145,7 @@ class SameConnectedCount(LeafCountStrategy):
     as the count of the subtree's 'connected leaves'."""
     
     def _leaves(self):
-        return self._old.connected_leaves
+        return self._old_shape.connected_leaves
 
 
 class ReplaceError(Exception):
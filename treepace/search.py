@@ -1,35 +1,106 @@
 """A tree-searching virtual machine, searching branch and match
 implementation."""
 
-from treepace.relations import Descendant
+import re
+from treepace.index import StructureIndex
+from treepace.instructions import Find, SearchReference, SetRelation
+from treepace.relations import (Child, Descendant, Identic, NextSibling,
+                                PreviousSibling)
 import treepace.trees
 from treepace.utils import ReprMixin, IPythonDotMixin
 from treepace.replace import ReplaceError
+from treepace.stats import SearchStats
 
 class SearchMachine(ReprMixin):
     """A tree-searching virtual machine."""
     
-    def __init__(self, node, instructions, variables, relation=Descendant):
-        """Initialize the VM with the default state."""
-        self.branches = [SearchBranch(node, instructions[:], self, relation)]
+    def __init__(self, node, instructions, variables, relation=Descendant,
+                 starts=None):
+        """Initialize the VM with the default state.
+        
+        If a list of start nodes is given, the pattern root is matched only
+        with these nodes (in the given order) instead of the nodes
+        in the relation with the node.
+        """
+        instructions = tuple(instructions)
+        if starts is None:
+            self.branches = [SearchBranch(node, instructions, self, relation)]
+        else:
+            self.branches = [SearchBranch(start, instructions, self, Identic)
+                             for start in starts]
         self.machine_vars = variables
+        # functions compiled from instruction expressions, by instruction id
+        self.functions = {}
+        self._instructions = instructions
+        self._memo_positions = memo_positions(instructions)
+        self._failed = set()
+        self._matches = 0
     
     def search(self):
         """Execute all instructions and return the search results."""
-        while any(branch.instructions for branch in self.branches):
-            new_branches = []
-            for branch in self.branches:
-                if branch.instructions:
-                    result = branch.instructions.pop(0).execute(branch)
-                    if result is not None:
-                        new_branches.extend(result)
-                    else:
-                        new_branches.append(branch)
+        return list(self.finditer())
+    
+    def finditer(self):
+        """Explore the branches depth-first and generate each match as soon
+        as all its instructions are executed.
+        
+        Only one pending iterator of new branches per forking instruction is
+        kept, so the memory usage is proportional to the pattern size.
+        If a SearchStats context is active, the work is counted by it.
+        """
+        stats = SearchStats.active()
+        if stats is not None:
+            return stats.run(self._explore(stats))
+        return self._explore()
+    
+    def _explore(self, stats=None):
+        stack = [iter(self.branches)]
+        while stack:
+            branch = next(stack[-1], None)
+            if branch is None:
+                stack.pop()
+                continue
+            while not branch.finished:
+                instruction = branch.next_instruction()
+                if stats is None:
+                    result = instruction.execute(branch)
                 else:
-                    new_branches.append(branch)
-            self.branches = new_branches
+                    result = stats.execute(instruction, branch)
+                if result is not None:
+                    if self._memo_positions:
+                        result = self.memoized(branch, result)
+                    stack.append(iter(result))
+                    if stats is not None:
+                        stats.deepen(len(stack))
+                    break
+            else:
+                self._matches += 1
+                yield branch.match
+    
+    def memoized(self, branch, branches):
+        """Return the new branches forked from the branch by a Find, or no
+        branches if the same state already failed to produce any match.
         
-        return [branch.match for branch in self.branches]
+        The remaining instructions at the memoized positions do not depend
+        on the match found so far, so whether they can succeed depends only
+        on the (position, context node, relation) state. A state which is
+        reached in many ways is therefore explored fully only while it
+        produces matches.
+        """
+        if (branch.position not in self._memo_positions
+                or branch.instructions is not self._instructions):
+            return branches
+        key = (branch.position, branch.node, branch.relation)
+        if key in self._failed:
+            return ()
+        return self._recording(key, branches)
+    
+    def _recording(self, key, branches):
+        matches = self._matches
+        for new_branch in branches:
+            yield new_branch
+        if self._matches == matches:
+            self._failed.add(key)
     
     def __str__(self):
         """Return the machine state in a form of a string."""
@@ -37,33 +108,154 @@ class SearchMachine(ReprMixin):
 
 
 class SearchBranch(ReprMixin):
-    """The search process can 'divide' itself into multiple branches."""
+    """The search process can 'divide' itself into multiple branches.
+    
+    All branch attributes are immutable or shared read-only, so forking
+    a branch does not copy any collections.
+    """
     
     def __init__(self, node, instructions, vm, relation):
         """Each branch is represented by a set of current group numbers,
-        a match object (a subtree list containing current results), a context
-        node, a current relation and an instruction list."""
-        self.groups = {0}
-        self.match = Match([treepace.trees.Subtree()])
+        a match state (a shared history of found nodes), a context node,
+        a current relation and an instruction tuple with a position."""
+        self.groups = frozenset({0})
+        self.group_count = 1
+        self.state = MatchState()
         self.node = node
         self.relation = relation
         self.instructions = instructions
+        self.position = 0
+        self.origin = None
+        self.generated = 0
         self.vm = vm
+        self._match = None
+    
+    @property
+    def finished(self):
+        """Return True if all instructions were executed."""
+        return self.position == len(self.instructions)
+    
+    def next_instruction(self):
+        """Return the next instruction and advance the position."""
+        self.position += 1
+        return self.instructions[self.position - 1]
+    
+    def prepend(self, instructions, origin=None):
+        """Insert the instructions generated by the origin instruction
+        before the remaining ones."""
+        remaining = self.instructions[self.position:]
+        self.instructions = tuple(instructions) + remaining
+        self.position = 0
+        self.origin = origin
+        self.generated = len(self.instructions) - len(remaining)
+    
+    def add_node(self, node):
+        """Add the node to all current groups and make it the context node."""
+        self.state = MatchState(self.state, node, self.groups)
+        self.node = node
+    
+    def group(self, number=0):
+        """Return the given group of the match found so far."""
+        return self.match.group(number)
+    
+    @property
+    def match(self):
+        """Return the match found so far; it is built from the match state
+        only when requested and it should not be modified."""
+        if self._match is None or self._match_state is not self.state:
+            self._match = self.state.to_match(self.group_count)
+            self._match_state = self.state
+        return self._match
     
     def copy(self):
         """Return a copy of this branch which can be modified without affecting
         the original branch."""
-        branch = SearchBranch(self.node, self.instructions[:], self.vm,
-                              self.relation)
-        branch.groups = self.groups.copy()
-        branch.match = self.match.copy()
+        branch = SearchBranch.__new__(SearchBranch)
+        branch.__dict__.update(self.__dict__)
         return branch
     
     def __str__(self):
         """Return the branch information as a string."""
         fmt = "groups: %s, match: %s, node: %s, relation: %s, instructions: %s"
-        return fmt % (self.groups, list(map(str, self.match.groups())),
-            self.node, self.relation.name, list(map(str, self.instructions)))
+        return fmt % (set(self.groups), list(map(str, self.match.groups())),
+            self.node, self.relation.name,
+            list(map(str, self.instructions[self.position:])))
+
+
+def memo_positions(instructions):
+    """Return a set of the branch positions (following Find instructions)
+    where the search can be memoized.
+    
+    The remaining instructions must not depend on the match found so far
+    (back-references and predicates using groups do) and the context node
+    must be reachable in more than one way -- through a relation which
+    does not determine the previous node, such as a parent or sibling.
+    """
+    independent = set()
+    for position in range(len(instructions), 0, -1):
+        instruction = instructions[position - 1]
+        if isinstance(instruction, SearchReference) or (
+                isinstance(instruction, Find) and _uses_groups(instruction)):
+            break
+        independent.add(position)
+    
+    result = set()
+    relation, finds, ambiguous = None, 0, False
+    for position, instruction in enumerate(instructions, 1):
+        if isinstance(instruction, SetRelation):
+            relation = instruction.relation
+        elif isinstance(instruction, Find):
+            if ambiguous and position in independent:
+                result.add(position)
+            if finds and relation not in _INJECTIVE:
+                ambiguous = True
+            finds += 1
+    return frozenset(result)
+
+
+# relations in which each node is found from at most one node
+_INJECTIVE = (Child, NextSibling, PreviousSibling, Identic)
+
+# the name 'group' (not an attribute); it can also match a string literal,
+# which only prevents memoization
+_GROUP_NAME = re.compile(r'(?<![\w.])group\b')
+
+def _uses_groups(find):
+    return (find.kind is None
+            and _GROUP_NAME.search(find.expression) is not None)
+
+
+class MatchState:
+    """An immutable record of one node added to the given groups, linked
+    to the previous state.
+    
+    Branches forked from the same branch share all previous states, so the
+    subtrees are built only for the branches which need them.
+    """
+    
+    __slots__ = ('parent', 'node', 'groups')
+    
+    def __init__(self, parent=None, node=None, groups=frozenset()):
+        """Create a state following the parent state (the initial state has
+        no parent)."""
+        self.parent = parent
+        self.node = node
+        self.groups = groups
+    
+    def to_match(self, group_count):
+        """Replay the node additions from the initial state and return a new
+        match with the given number of groups."""
+        states = []
+        state = self
+        while state.parent is not None:
+            states.append(state)
+            state = state.parent
+        
+        subtrees = [treepace.trees.Subtree() for _ in range(group_count)]
+        for state in reversed(states):
+            for group in state.groups:
+                subtrees[group].add_path(state.node)
+        return Match(subtrees)
 
 
 class Match(ReprMixin, IPythonDotMixin):
@@ -88,8 +280,28 @@ class Match(ReprMixin, IPythonDotMixin):
     @staticmethod
     def check_disjoint(matches):
         """Raise ReplaceError if there exists a node which is present
-        in at least two matches from the given list of matches."""
-        subtree_nodes = [match.group().nodes for match in matches]
+        in at least two matches from the given list of matches.
+        
+        If the tree has a StructureIndex, only the match roots are compared:
+        two subtrees overlap exactly when the root of one is in the other.
+        """
+        subtrees = [match.group() for match in matches]
+        structure = StructureIndex.of(subtrees[0].root) if subtrees else None
+        if structure is not None and all(subtree.root in structure
+                                         for subtree in subtrees):
+            enclosing = []
+            subtrees.sort(key=lambda subtree: structure.position(subtree.root))
+            for subtree in subtrees:
+                root = subtree.root
+                while enclosing and not structure.is_ancestor(
+                        enclosing[-1].root, root):
+                    enclosing.pop()
+                if any(root in other.nodes for other in enclosing):
+                    raise ReplaceError("Overlapping matches")
+                enclosing.append(subtree)
+            return
+        
+        subtree_nodes = [subtree.nodes for subtree in subtrees]
         total_count = sum(map(len, subtree_nodes))
         if len(set().union(*subtree_nodes)) < total_count:
             raise ReplaceError("Overlapping matches")
@@ -0,0 +1,186 @@
+"""Optional statistics of the search virtual machine.
+
+The statistics are collected only while a SearchStats object is used as
+a context manager. The search loop then executes the instructions through
+the hooks of the statistics; otherwise, it only checks that they are None.
+"""
+
+import threading
+from time import perf_counter
+from treepace.instructions import Find, SearchReference
+from treepace.utils import ReprMixin
+
+# the innermost active statistics of each thread
+_local = threading.local()
+
+class SearchStats(ReprMixin):
+    """Counters of all searches executed in the current thread while
+    the context is active, e.g.:
+    
+        with SearchStats() as stats:
+            tree.search('a < b')
+        print(stats)
+    
+    The planning of tree searches (see Tree.explain) is counted separately.
+    The searches in other threads and processes (parallel_search) and the
+    prefix matching of transformation programs are not counted.
+    """
+    
+    def __init__(self):
+        """Create empty statistics."""
+        self.searches = 0
+        self.matches = 0
+        self.peak_depth = 0
+        self.time = 0.0
+        self.planned_nodes = 0
+        self.planning_time = 0.0
+        self._entries = {}
+        self._previous = None
+    
+    @staticmethod
+    def active():
+        """Return the statistics of the innermost active context in this
+        thread, or None."""
+        return getattr(_local, 'stats', None)
+    
+    @property
+    def instructions(self):
+        """Return a list of InstructionStats in the order in which
+        the instructions were first executed."""
+        return [entry for _, entry in self._entries.values()]
+    
+    def run(self, matches):
+        """Generate the matches from the search loop of a machine, counting
+        the search, the matches and the time spent finding them."""
+        self.searches += 1
+        self.peak_depth = max(self.peak_depth, 1)
+        while True:
+            begin = perf_counter()
+            match = next(matches, None)
+            self.time += perf_counter() - begin
+            if match is None:
+                return
+            self.matches += 1
+            yield match
+    
+    def execute(self, instruction, branch):
+        """Execute the instruction on the branch like the search loop does,
+        counting the candidates and predicate evaluations of a Find and
+        the expansions of a SearchReference.
+        
+        The instructions generated by a back-reference are counted as a part
+        of it, but not as its executions; they are recognized by their
+        position in the branch, so they are not kept after the search.
+        """
+        if branch.position <= branch.generated:
+            entry = self._entries[id(branch.origin)][1]
+        else:
+            entry = self._count_execution(instruction)
+        if isinstance(instruction, Find):
+            nodes, predicate = instruction.candidates(branch)
+            return self._branches(branch, nodes, predicate, entry)
+        begin = perf_counter()
+        result = instruction.execute(branch)
+        entry.time += perf_counter() - begin
+        if isinstance(instruction, SearchReference):
+            entry.expansions += 1
+        return result
+    
+    def count_planning(self, visited, time):
+        """Count the planning of a search (see planner.plan_search) which
+        visited the given number of nodes."""
+        self.planned_nodes += visited
+        self.planning_time += time
+    
+    def deepen(self, depth):
+        """Record the number of nested iterators of pending branches."""
+        self.peak_depth = max(self.peak_depth, depth)
+    
+    def _count_execution(self, instruction):
+        """Count the execution of the instruction and return its entry.
+        
+        The instruction is kept with its entry, so its id cannot be reused.
+        """
+        item = self._entries.get(id(instruction))
+        if item is None:
+            item = (instruction, InstructionStats(str(instruction)))
+            self._entries[id(instruction)] = item
+        item[1].executions += 1
+        return item[1]
+    
+    @staticmethod
+    def _branches(branch, nodes, predicate, entry):
+        created = False
+        begin = perf_counter()
+        for node in nodes:
+            entry.candidates += 1
+            if predicate is not None:
+                entry.predicate_evaluations += 1
+                if not predicate(node):
+                    continue
+            new_branch = branch.copy()
+            new_branch.add_node(node)
+            entry.branches_created += 1
+            created = True
+            entry.time += perf_counter() - begin
+            yield new_branch
+            begin = perf_counter()
+        entry.time += perf_counter() - begin
+        if not created:
+            entry.branches_pruned += 1
+    
+    def __enter__(self):
+        """Start counting the searches in this thread."""
+        self._previous = SearchStats.active()
+        _local.stats = self
+        return self
+    
+    def __exit__(self, *exc_info):
+        """Stop counting; the enclosing context (if any) becomes active."""
+        _local.stats = self._previous
+    
+    def __str__(self):
+        """Return a table of the instruction statistics and the totals."""
+        header = ("%-24s %8s %8s %8s %10s %10s %6s %9s" % ('instruction',
+                  'execs', 'created', 'pruned', 'candidates', 'predicates',
+                  'srefs', 'ms'))
+        lines = [header]
+        for entry in self.instructions:
+            lines.append("%-24s %8d %8d %8d %10d %10d %6d %9.3f" % (
+                entry.instruction[:24], entry.executions,
+                entry.branches_created, entry.branches_pruned,
+                entry.candidates, entry.predicate_evaluations,
+                entry.expansions, 1000 * entry.time))
+        lines.append("searches: %d, matches: %d, peak depth: %d, "
+                     "time: %.3f ms" % (self.searches, self.matches,
+                                        self.peak_depth, 1000 * self.time))
+        lines.append("planning: %d nodes, %.3f ms" % (
+            self.planned_nodes, 1000 * self.planning_time))
+        return '\n'.join(lines)
+
+
+class InstructionStats(ReprMixin):
+    """The counters of one instruction.
+    
+    The branches created by a Find are the nodes which matched; a branch is
+    pruned when a Find does not create any new branch from it. The time
+    includes finding the candidates lazily, as the branches are explored.
+    """
+    
+    def __init__(self, instruction):
+        """Set all counters of the instruction (given as a string) to zero."""
+        self.instruction = instruction
+        self.executions = 0
+        self.branches_created = 0
+        self.branches_pruned = 0
+        self.candidates = 0
+        self.predicate_evaluations = 0
+        self.expansions = 0
+        self.time = 0.0
+    
+    def __str__(self):
+        """Return the instruction and its non-zero counters."""
+        counters = ', '.join('%s: %s' % (name, value) for name, value
+                             in sorted(self.__dict__.items())
+                             if name != 'instruction' and value)
+        return "%s (%s)" % (self.instruction, counters)
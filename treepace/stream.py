@@ -0,0 +1,163 @@
+"""A search in XML documents which are too large to be loaded as a whole."""
+
+from treepace.compiler import Compiler
+from treepace.formats import XmlText
+from treepace.index import subtree_nodes
+from treepace.instructions import Find, SetRelation
+from treepace.nodes import Node
+from treepace.program import CombinedMatcher, pattern_reach
+from treepace.relations import Child, Identic, NextSibling, Parent
+from treepace.search import SearchMachine
+
+class XmlStream:
+    """A pattern searched in an XML document while it is being parsed.
+    
+    The nodes are created in the same way as by XmlText. A match is generated
+    as soon as all nodes which the pattern can reach are parsed, so the matches
+    are ordered by the end of their reach, not by their roots.
+    
+    Nodes which cannot be reached by any further match are detached, so the
+    memory usage is proportional to the document depth and the pattern size.
+    The nodes of generated matches stay connected to each other. A pattern
+    which can reach any sibling of the match root (not only the following
+    ones in a bounded distance) keeps the closed siblings until their parent
+    is closed.
+    """
+    
+    def __init__(self, pattern, node_class=Node, **variables):
+        """Compile the pattern, which must not contain back-references and
+        predicates using the node object or whole groups."""
+        self.instructions = Compiler.compile_pattern(pattern)
+        reach = pattern_reach(self.instructions)
+        if reach is None:
+            raise StreamError("The pattern reach is not bounded")
+        self.low, self.high = reach
+        self.siblings = sibling_reach(self.instructions)
+        self.node_class = node_class
+        self.variables = variables
+        
+        prefix = []
+        for instruction in self.instructions:
+            prefix.append(instruction)
+            if isinstance(instruction, Find):
+                break
+        self._first = CombinedMatcher([prefix], 'str' not in variables)
+    
+    def finditer(self, source):
+        """Parse the XML string or file incrementally and generate
+        the matches."""
+        vm = SearchMachine(None, [], self.variables)
+        self._pinned = set()
+        self._candidates = set()
+        # open nodes
+        stack = []
+        
+        for event, node in XmlText().parse_events(source, self.node_class):
+            if event == 'start':
+                if self._first.match(node, vm):
+                    self._candidates.add(node)
+                stack.append(node)
+                continue
+            
+            stack.pop()
+            # the children whose following siblings were not parsed
+            for child in node.children:
+                for match in self._matches(child):
+                    yield match
+            behind = node if not stack else self._sibling_behind(node)
+            if behind is not None:
+                for match in self._matches(behind):
+                    yield match
+            self._evict(node, self._keep_depth(node, stack, True))
+            if behind is not None and behind is not node:
+                self._evict(behind, self._keep_depth(behind, stack, False))
+    
+    def _matches(self, root):
+        """Generate the matches from the root if it is a candidate which was
+        not searched yet."""
+        if root not in self._candidates:
+            return
+        self._candidates.discard(root)
+        machine = SearchMachine(root, self.instructions, self.variables,
+                                relation=Identic)
+        for match in machine.finditer():
+            self._pinned.update(match.group().nodes)
+            yield match
+    
+    def _sibling_behind(self, node):
+        """Return the sibling whose reach ends with the closed node -- as many
+        siblings before it as the pattern can reach -- or None."""
+        if self.siblings is None:
+            return None
+        for _ in range(self.siblings):
+            node = node.previous_sibling
+            if node is None:
+                return None
+        return node
+    
+    def _reaching(self, node):
+        """Return True if a match not searched yet can start at the node
+        or at a sibling before it and reach the node's subtree."""
+        if self.siblings is None:
+            return True
+        for _ in range(self.siblings + 1):
+            if node is None:
+                return False
+            if node in self._candidates:
+                return True
+            node = node.previous_sibling
+        return False
+    
+    def _keep_depth(self, node, stack, itself):
+        """Return the depth (relative to the node, whose ancestors are
+        the open nodes) up to which its descendants can be reached from
+        the roots of further matches. The matches starting at the node
+        and its siblings are considered only if 'itself' is True."""
+        if itself and self._reaching(node):
+            return self.high
+        for distance in range(1, min(self.high, len(stack)) + 1):
+            if self._reaching(stack[-distance]):
+                return self.high - distance
+        return -1
+    
+    def _evict(self, node, keep_depth):
+        """Detach the node's descendants deeper than the given depth (the node
+        itself if the depth is negative), except for the connections between
+        nodes of the generated matches."""
+        stack = [(node, 0)]
+        while stack:
+            current, depth = stack.pop()
+            if depth > keep_depth and not (current in self._pinned
+                                           and current.parent in self._pinned):
+                if current.parent is not None:
+                    current.detach()
+                if self._pinned:
+                    self._pinned.difference_update(subtree_nodes(current))
+            else:
+                stack.extend((child, depth + 1) for child in current.children)
+
+
+def sibling_reach(instructions):
+    """Return the number of following siblings of the match root which
+    the pattern can reach, or None if it can reach any sibling."""
+    level = offset = reach = 0
+    relation = None
+    for instruction in instructions:
+        if isinstance(instruction, SetRelation):
+            relation = instruction.relation
+        elif isinstance(instruction, Find):
+            if relation is Child:
+                level += 1
+            elif relation is Parent:
+                level -= 1
+            elif level == 0 and relation is NextSibling:
+                offset += 1
+                reach = max(reach, offset)
+            elif level == 0 and relation is not None:
+                return None
+    return reach
+
+
+class StreamError(Exception):
+    """Raised when a pattern cannot be searched in a stream."""
+    pass
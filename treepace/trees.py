@@ -1,41 +1,71 @@
-"""The main tree class and a subtree implementation."""
+"""The main tree classes and a subtree implementation."""
 
 from treepace.base import TreeBase
 from treepace.build import BuildMachine
 from treepace.compiler import Compiler
 from treepace.formats import ParenText, DotText
+from treepace.index import StructureIndex, document_order, is_ancestor
 from treepace.nodes import Node
+from treepace.planner import plan_search
+from treepace.program import Program
 from treepace.relations import Identic
-from treepace.replace import ReplaceError, ReplaceStrategy
+from treepace.replace import ReplaceError, ReplaceStrategy, Shape
 from treepace.search import Match, SearchMachine
 
-class Tree(TreeBase):
-    """A general tree which can contain any types of nodes."""
-    
-    def __init__(self, root):
-        """Initialize the tree with a root node which can never be deleted
-        (only replaced)."""
-        self._root = root
-    
-    @TreeBase.root.setter
-    def root(self, _root):
-        """Set a new root node."""
-        self._root = _root
-    
-    @classmethod
-    def load(cls, string, fmt=ParenText, node_class=Node, *args, **kwargs):
-        """Create a new tree by importing it from a string in a given format."""
-        return cls(fmt().load_tree(string, node_class, *args, **kwargs))
+class SearchableTree(TreeBase):
+    """A tree which can be searched and exported; the modifying operations
+    are available only in its subclasses."""
     
     def save(self, fmt, *args, **kwargs):
         """Export the tree to a string in a given format."""
         return fmt().save_tree(self.root, *args, **kwargs)
     
+    def save_to(self, file, fmt, *args, **kwargs):
+        """Export the tree to a text file in a given format, writing
+        the output incrementally."""
+        fmt().save_to(self.root, file, *args, **kwargs)
+    
     def search(self, pattern, **variables):
         """Search for a given pattern anywhere in the tree and return a list
-        of matches."""
+        of matches.
+        
+        The search starts from the most selective node of the pattern
+        (see explain()).
+        """
+        instructions = Compiler.compile_pattern(pattern)
+        plan = plan_search(self.root, instructions, variables)
+        return list(plan.finditer(self.root, variables))
+    
+    def explain(self, pattern, **variables):
+        """Return the plan which search() would use for the pattern; its
+        string form describes the anchor and the estimated node counts."""
+        instructions = Compiler.compile_pattern(pattern)
+        return plan_search(self.root, instructions, variables)
+    
+    def finditer(self, pattern, **variables):
+        """Search for a given pattern anywhere in the tree and return
+        a generator of matches which are found lazily."""
         instructions = Compiler.compile_pattern(pattern)
-        return SearchMachine(self.root, instructions, variables).search()
+        return SearchMachine(self.root, instructions, variables).finditer()
+    
+    def parallel_search(self, pattern, processes=None, **variables):
+        """Search for a given pattern using a pool of processes sharing
+        a snapshot of the tree and return the same list of matches as search().
+        
+        The node values and variables must be picklable.
+        """
+        from treepace.parallel import SharedTree
+        with SharedTree(self, processes) as shared:
+            return shared.search(pattern, **variables)
+    
+    def first(self, pattern, **variables):
+        """Return the first match of the pattern or None if there is no
+        match."""
+        return next(self.finditer(pattern, **variables), None)
+    
+    def exists(self, pattern, **variables):
+        """Return True if the pattern matches anywhere in the tree."""
+        return self.first(pattern, **variables) is not None
     
     def match(self, pattern, **variables):
         """Search for a given pattern from the root node and return a list
@@ -48,10 +78,69 @@ class Tree(TreeBase):
         """If the tree matches the pattern from the root to the leaves, return
         a list of matches, otherwise return an empty list."""
         matches = self.match(pattern, **variables)
+        if not matches:
+            return []
         matched_nodes = set().union(*[match.group().nodes for match in matches])
-        all_node_count = sum(1 for _ in self.preorder())
+        structure = StructureIndex.of(self.root)
+        if structure is not None and self.root.parent is None:
+            all_node_count = len(structure)
+        else:
+            all_node_count = sum(1 for _ in self.preorder())
         return matches if len(matched_nodes) == all_node_count else []
     
+    def is_ancestor(self, ancestor, node):
+        """Return True if the first node is an ancestor of the second one
+        or if they are the same node; with a StructureIndex, this is
+        a comparison of the node numbers."""
+        return is_ancestor(ancestor, node)
+    
+    def document_order(self, nodes):
+        """Return a list of the given nodes of this tree sorted in pre-order,
+        using a StructureIndex if the tree has one."""
+        return document_order(nodes)
+    
+    def _node_children(self, node):
+        return node.children
+    
+    def __str__(self):
+        """Return a parenthesized-text representation of this tree."""
+        return self.save(ParenText)
+    
+    def __eq__(self, other):
+        """Values of all tree nodes are compared."""
+        stack = [(self.root, other.root)]
+        while stack:
+            node, other_node = stack.pop()
+            children, other_children = node.children, other_node.children
+            if (node.value != other_node.value
+                    or len(children) != len(other_children)):
+                return False
+            stack.extend(zip(children, other_children))
+        return True
+    
+    def _repr_dot_(self):
+        return self.save(DotText)
+
+
+class Tree(SearchableTree):
+    """A general tree which can contain any types of nodes."""
+    
+    def __init__(self, root):
+        """Initialize the tree with a root node which can never be deleted
+        (only replaced)."""
+        self._root = root
+    
+    @TreeBase.root.setter
+    def root(self, _root):
+        """Set a new root node."""
+        self._root = _root
+    
+    @classmethod
+    def load(cls, source, fmt=ParenText, node_class=Node, *args, **kwargs):
+        """Create a new tree by importing it from a string or a file (a text,
+        binary or memory-mapped one) in a given format."""
+        return cls(fmt().load_tree(source, node_class, *args, **kwargs))
+    
     def replace(self, pattern, replacement, **variables):
         """Replace each found subtree with a new subtree.
         
@@ -75,51 +164,31 @@ class Tree(TreeBase):
         in the form: pattern -> replacement.
         
         Each rule is executed while its pattern matches. In addition, the whole
-        rule list is looped until no rule matches.
+        rule list is looped until no rule matches. The program can be
+        a string or a compiled Program object.
         """
-        lines = (line for line in program.splitlines() if line.strip())
-        rules = [Compiler.compile_rule(line) for line in lines]
-        
-        while True:
-            rule_matched = False
-            for search, replace in rules:
-                matches = True
-                while matches:
-                    machine = SearchMachine(self.root, search, variables)
-                    matches = machine.search()
-                    Match.check_disjoint(matches)
-                    for match in matches:
-                        tree = BuildMachine(match, replace, variables).build()
-                        match.group().replace_by(tree)
-                    if matches:
-                        rule_matched = True
-            if not rule_matched:
-                break
+        if isinstance(program, str):
+            program = Program(program)
+        program.execute(self, variables)
     
-    def copy(self):
-        """Shallow-copy the tree."""
-        def make_tree(node):
-            children = (make_tree(child) for child in node.children)
-            return node.__class__(node.value, children)
+    def add_index(self, index):
+        """Attach the index (e.g., a ValueIndex) to all nodes of the tree.
         
-        return Tree(make_tree(self._root))
-    
-    def _node_children(self, node):
-        return node.children
-    
-    def __str__(self):
-        """Return a parenthesized-text representation of this tree."""
-        return self.save(ParenText)
+        The nodes keep the index up to date when their values are set and
+        when subtrees are inserted or detached.
+        """
+        self._root._set_indexes(self._root._indexes + (index,))
+        index.insert(self._root)
+        return index
     
-    def __eq__(self, other):
-        """Values of all tree nodes are compared."""
-        self_subtrees = [Tree(c) for c in self.root.children]
-        other_subtrees = [Tree(c) for c in other.root.children]
-        return (self.root.value == other.root.value
-                and self_subtrees == other_subtrees)
+    def remove_index(self, index):
+        """Detach the index from all nodes of the tree."""
+        indexes = tuple(i for i in self._root._indexes if i is not index)
+        self._root._set_indexes(indexes)
     
-    def _repr_dot_(self):
-        return self.save(DotText)
+    def copy(self):
+        """Shallow-copy the tree."""
+        return Tree(self._copy_nodes())
 
 
 class Subtree(TreeBase):
@@ -148,6 +217,36 @@ class Subtree(TreeBase):
             raise SubtreeError("Disconnected subtree node '%s'" % node)
         self._nodes.add(node)
     
+    def add_path(self, node):
+        """Add the node and the nodes on the path connecting it to the
+        subtree.
+        
+        It must be a descendant of some node currently present in the subtree
+        or an ancestor of the subtree root.
+        """
+        if self._root is None:
+            self.add_node(node)
+            return
+        path = []
+        current = node
+        while current is not None and current not in self._nodes:
+            path.append(current)
+            current = current.parent
+        if current is None:
+            # an ancestor of the root: add the nodes above the root up to it
+            path = []
+            current = self._root.parent
+            while current is not None and current != node:
+                path.append(current)
+                current = current.parent
+            if current is None:
+                raise SubtreeError("Disconnected subtree node '%s'" % node)
+            path.append(node)
+        else:
+            path.reverse()
+        for path_node in path:
+            self.add_node(path_node)
+    
     def remove_node(self, node):
         """Remove the given leaf node from the subtree."""
         if not next(self._node_children(node), False):
@@ -169,11 +268,7 @@ class Subtree(TreeBase):
     
     def to_tree(self):
         """Shallow-copy subtree node values into a new tree (with new nodes)."""
-        def make_tree(node):
-            children = (make_tree(child) for child in self._node_children(node))
-            return node.__class__(node.value, children)
-        
-        return Tree(make_tree(self._root)) if self._root else None
+        return Tree(self._copy_nodes()) if self._root else None
     
     def main_tree(self):
         """Return the main tree associated with this subtree.
@@ -187,9 +282,14 @@ class Subtree(TreeBase):
     
     def replace_by(self, tree):
         """Try available replacement strategies and raise an exception if
-        neither of them is applicable."""
+        neither of them is applicable.
+        
+        The shapes of both trees are computed once and shared by all
+        the strategies.
+        """
+        shapes = (Shape(self._root, self._nodes), Shape(tree.root))
         for strategy in ReplaceStrategy.all_strategies():
-            replacer = strategy(self, tree)
+            replacer = strategy(self, tree, shapes)
             if replacer.test():
                 replacer.apply()
                 return
@@ -1,6 +1,5 @@
 """Utility functions and mix-in classes."""
 import builtins
-from urllib.parse import quote_plus
 
 class EqualityMixin:
     """Equality and inequality operator overloading based on attributes."""
@@ -20,6 +19,8 @@ class EqualityMixin:
 class ReprMixin:
     """Default string and debugging representations of objects."""
     
+    __slots__ = ()
+    
     def __str__(self):
         """Ideally, subclasses should supply their own implementations."""
         return str(self.__dict__)
@@ -38,6 +39,8 @@ class IPythonDotMixin:
     code in DOT graph specification language.
     """
     
+    __slots__ = ()
+    
     def _repr_png_(self):
         from IPython.core.display import Image
         return Image(url=self._url())._repr_png_()
@@ -47,6 +50,7 @@ class IPythonDotMixin:
         return Image(url=self._url())._repr_html_()
     
     def _url(self):
+        from urllib.parse import quote_plus
         url = 'https://chart.googleapis.com/chart?cht=gv&chl='
         return url + quote_plus(self._repr_dot_()) + '&ext=.png'
 